@@ -1,9 +1,10 @@
 import json
+import asyncio
 from abc import ABC, abstractmethod
 from loguru import logger
 from typing import Any, Optional, TYPE_CHECKING
 from langchain.prompts import PromptTemplate
-from ExpertRecSystem.utils import read_prompts
+from ExpertRecSystem.utils import read_prompts, PromptBudget
 from ExpertRecSystem.llms import BaseLLM, AnyOpenAILLM
 
 if TYPE_CHECKING:
@@ -57,6 +58,9 @@ class Agent(ABC):
     def __call__(self, *args: Any, **kwargs: Any) -> Any:
         return self.forward(*args, **kwargs)
 
+    async def acall(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.aforward(*args, **kwargs)
+
     @abstractmethod
     def forward(self, *args: Any, **kwargs: Any) -> Any:
         """Forward pass of the agent.
@@ -68,6 +72,14 @@ class Agent(ABC):
         """
         raise NotImplementedError("Agent.forward() not implemented")
 
+    async def aforward(self, *args: Any, **kwargs: Any) -> Any:
+        """Asynchronous forward pass of the agent. Runs `forward` in a worker thread unless overridden with a natively asynchronous LLM call.
+
+        Returns:
+            `Any`: The agent output.
+        """
+        return await asyncio.to_thread(self.forward, *args, **kwargs)
+
     def get_LLM(
         self, config_path: Optional[str] = None, config: Optional[dict] = None
     ) -> BaseLLM:
@@ -89,3 +101,19 @@ class Agent(ABC):
             raise NotImplementedError("Agents do not support opensource llm currently")
         else:
             return AnyOpenAILLM(**config)
+
+    def get_prompt_budget(
+        self, llm: BaseLLM, prompt_budget: Optional[int] = None
+    ) -> PromptBudget:
+        """Get the prompt budget of an LLM of the agent.
+
+        Args:
+            `llm` (`BaseLLM`): The LLM.
+            `prompt_budget` (`Optional[int]`): The configured maximum number of prompt tokens. Never exceeds `llm.tokens_limit`. Defaults to `None`, i.e. `llm.tokens_limit`.
+        Returns:
+            `PromptBudget`: The prompt budget.
+        """
+        budget = llm.tokens_limit
+        if prompt_budget is not None:
+            budget = min(prompt_budget, budget)
+        return PromptBudget(llm.count_tokens, budget)
@@ -1,4 +1,6 @@
+import json
 from langchain.prompts import PromptTemplate
+from loguru import logger
 from typing import Any
 from ExpertRecSystem.agents.base import Agent
 from ExpertRecSystem.utils import read_json
@@ -8,6 +10,7 @@ class ExpertAnalyst(Agent):
     """
     The ExpertAnalyst class extends the base Agent class to perform expert analysis using a language model.
     It initializes the language model based on a configuration file and builds prompts for expert analysis.
+    In packed mode several experts are analysed in one call, which repeats the instructions once per pack instead of once per expert.
     """
 
     def __init__(self, config_path: str, *args, **kwargs) -> None:
@@ -21,8 +24,26 @@ class ExpertAnalyst(Agent):
         """
         super().__init__(*args, **kwargs)
         config = read_json(config_path)
+        packing = config.pop("packing", None)
+        packed_config = dict(config)
         self.expert_analyst = self.get_LLM(config=config)
         self.json_mode = self.expert_analyst.json_mode
+        if packing is not None:
+            # A pack needs room for the analyses of all its experts
+            self.packed_analyst = self.get_LLM(
+                config={**packed_config, "max_tokens": packing["max_tokens"]}
+            )
+            self.packed_budget = self.get_prompt_budget(
+                self.packed_analyst, packing.get("prompt_budget")
+            )
+            # Each analysis gets as many output tokens as a single call
+            expert_tokens = packing.get("expert_tokens", self.expert_analyst.max_tokens)
+            self.max_pack_size = max(
+                1, min(packing["max_experts"], packing["max_tokens"] // expert_tokens)
+            )
+        else:
+            self.packed_analyst = None
+            self.max_pack_size = 1
 
     @property
     def expert_analyst_prompt(self) -> PromptTemplate:
@@ -34,6 +55,16 @@ class ExpertAnalyst(Agent):
         """
         return self.prompts["expert_analyst_prompt"]
 
+    @property
+    def expert_analyst_packed_prompt(self) -> str:
+        """
+        Property that returns the prompt head for analysing several experts at once.
+
+        Returns:
+            `str`: The prompt head for packed expert analysis.
+        """
+        return self.prompts["expert_analyst_packed_prompt"]
+
     def _build_expert_prompt(self, **kwargs) -> str:
         """
         Build the expert prompt by formatting the prompt template with provided expert information.
@@ -60,6 +91,143 @@ class ExpertAnalyst(Agent):
 
         return prompt
 
+    @staticmethod
+    def _format_packed_expert(expert: dict) -> str:
+        """
+        Format one expert of a packed prompt.
+
+        Args:
+            `expert` (`dict`): The expert with `expert_id`, `expert_name`, `specialty`, `projects` and `project_infos`.
+
+        Returns:
+            `str`: The expert block.
+        """
+        block = f"\n专家编号:{expert['expert_id']}\n姓名:{expert['expert_name']}\n专业:{expert['specialty']}\n评审过的项目如下:"
+        for i, (name, info) in enumerate(
+            zip(expert["projects"], expert["project_infos"]), start=1
+        ):
+            block += f"\n{i}.(1)项目名称:{name}\n(2)项目简介:{info}\n"
+        return block
+
+    def _build_packed_prompt(self, experts: list[dict]) -> str:
+        """
+        Build the prompt that analyses several experts at once.
+
+        Args:
+            `experts` (`list[dict]`): The experts, see `_format_packed_expert`.
+
+        Returns:
+            `str`: The formatted prompt string ready for packed expert analysis.
+        """
+        return self.expert_analyst_packed_prompt + "".join(
+            self._format_packed_expert(expert) for expert in experts
+        )
+
+    def pack(self, experts: list[dict]) -> list[list[dict]]:
+        """
+        Group experts into packs in order. A pack holds at most `max_pack_size` experts, set by the output tokens of the packed LLM, and its prompt fits the prompt budget. A pack never repeats an expert ID. An expert too large for any pack is packed alone and analysed with a single call.
+
+        Args:
+            `experts` (`list[dict]`): The experts, see `_format_packed_expert`.
+
+        Returns:
+            `list[list[dict]]`: The packs.
+        """
+        if self.packed_analyst is None:
+            return [[expert] for expert in experts]
+        count_tokens = self.packed_budget.count_tokens
+        head_tokens = count_tokens(self.expert_analyst_packed_prompt)
+        packs, pack, tokens = [], [], head_tokens
+        for expert in experts:
+            expert_tokens = count_tokens(self._format_packed_expert(expert))
+            if pack and (
+                len(pack) >= self.max_pack_size
+                or tokens + expert_tokens > self.packed_budget.budget
+                or str(expert["expert_id"])
+                in {str(packed["expert_id"]) for packed in pack}
+            ):
+                packs.append(pack)
+                pack, tokens = [], head_tokens
+            pack.append(expert)
+            tokens += expert_tokens
+        if pack:
+            packs.append(pack)
+        return packs
+
+    @staticmethod
+    def _parse_packed_response(response: str, experts: list[dict]) -> dict[str, str]:
+        """
+        Parse the JSON object of a packed response. A response cut off at the token limit keeps the entries completed before the cut.
+
+        Args:
+            `response` (`str`): The LLM output.
+            `experts` (`list[dict]`): The experts of the pack.
+
+        Returns:
+            `dict[str, str]`: The analyses by expert ID, only for the experts of the pack with a non-empty analysis.
+        """
+        start = response.find("{")
+        if start == -1:
+            return {}
+        decoder = json.JSONDecoder()
+        try:
+            analyses, _ = decoder.raw_decode(response, start)
+        except json.JSONDecodeError:
+            # Read the complete "key": value pairs one by one
+            analyses, position = {}, start + 1
+            try:
+                while True:
+                    while position < len(response) and response[position] in " \t\r\n,":
+                        position += 1
+                    key, position = decoder.raw_decode(response, position)
+                    while position < len(response) and response[position] in " \t\r\n:":
+                        position += 1
+                    value, position = decoder.raw_decode(response, position)
+                    analyses[key] = value
+            except json.JSONDecodeError:
+                pass
+        if not isinstance(analyses, dict):
+            return {}
+        analyses = {str(key).strip(): value for key, value in analyses.items()}
+        results = {}
+        for expert in experts:
+            expert_id = str(expert["expert_id"])
+            analysis = analyses.get(expert_id)
+            if isinstance(analysis, str) and analysis.strip():
+                results[expert_id] = analysis.strip()
+        return results
+
+    def forward_packed(self, experts: list[dict]) -> dict[str, str]:
+        """
+        Analyse a pack of experts with one call. The experts missing from the response or with an invalid analysis fall back to single-expert calls, so every expert gets an analysis.
+
+        Args:
+            `experts` (`list[dict]`): The experts, see `_format_packed_expert`. The expert IDs must be unique.
+
+        Returns:
+            `dict[str, str]`: The analyses by expert ID as a string.
+        """
+        analyses = {}
+        if self.packed_analyst is not None and len(experts) > 1:
+            prompt = self._build_packed_prompt(experts)
+            response = self.packed_analyst(prompt)
+            analyses = self._parse_packed_response(response, experts)
+            if len(analyses) < len(experts):
+                logger.warning(
+                    f"Packed analysis returned {len(analyses)}/{len(experts)} experts, "
+                    "analysing the rest one by one"
+                )
+        for expert in experts:
+            expert_id = str(expert["expert_id"])
+            if expert_id not in analyses:
+                analyses[expert_id] = self.forward(
+                    expert_name=expert["expert_name"],
+                    specialty=expert["specialty"],
+                    projects=expert["projects"],
+                    project_infos=expert["project_infos"],
+                )
+        return analyses
+
     def forward(self, **kwargs: Any) -> Any:
         """
         Forward pass of the ExpertAnalyst. Builds the expert prompt and processes it with the language model.
@@ -73,3 +241,17 @@ class ExpertAnalyst(Agent):
         prompt = self._build_expert_prompt(**kwargs)
         response = self.expert_analyst(prompt)
         return response
+
+    async def aforward(self, **kwargs: Any) -> Any:
+        """
+        Asynchronous forward pass of the ExpertAnalyst. Builds the expert prompt and awaits the language model, so other requests can proceed while it waits on the API.
+
+        Args:
+            `**kwargs` (`Any`): The keyword arguments needed to build the expert prompt.
+
+        Returns:
+            `Any`: The response generated by the language model based on the built prompt.
+        """
+        prompt = self._build_expert_prompt(**kwargs)
+        response = await self.expert_analyst.acall(prompt)
+        return response
@@ -1,4 +1,5 @@
 from langchain.prompts import PromptTemplate
+from loguru import logger
 from typing import Any
 from ExpertRecSystem.agents.base import Agent
 from ExpertRecSystem.utils import read_json
@@ -11,6 +12,9 @@ class Explainer(Agent):
     file and builds prompts for generating explanations.
     """
 
+    # Expert fields shown to the LLM
+    expert_fields = ["rank", "name", "specialist", "description"]
+
     def __init__(self, config_path: str, *args, **kwargs) -> None:
         """
         Initialize the Explainer with the specified configuration file.
@@ -22,8 +26,10 @@ class Explainer(Agent):
         """
         super().__init__(*args, **kwargs)
         config = read_json(config_path)
+        prompt_budget = config.pop("prompt_budget", None)
         self.explainer = self.get_LLM(config=config)
         self.json_mode = self.explainer.json_mode
+        self.budget = self.get_prompt_budget(self.explainer, prompt_budget)
 
     @property
     def explainer_prompt(self) -> PromptTemplate:
@@ -55,7 +61,7 @@ class Explainer(Agent):
 
         Args:
             `project` (`str`): The name or description of the project.
-            `experts` (`list`): A list of expert descriptions.
+            `experts` (`list[dict]`): The experts, compacted to `expert_fields` within the prompt budget.
 
         Returns:
             `str`: The formatted prompt string ready for generating explanations.
@@ -66,21 +72,37 @@ class Explainer(Agent):
             example=self.explainer_example,
             project=project,
         )
-        for i, des in enumerate(experts, start=1):
-            prompt += f"\n专家{i}:{des}\n"
-
+        prompt, stats = self.budget.build(prompt, experts, self.expert_fields)
+        logger.debug(f"Explainer prompt tokens: {stats}")
         return prompt
 
-    def forward(self, **kwargs: Any) -> Any:
+    def forward(self, stream: bool = False, **kwargs: Any) -> Any:
         """
         Forward pass of the Explainer. Builds the explainer prompt and processes it with the language model.
 
         Args:
+            `stream` (`bool`, optional): Whether to stream the response. Defaults to `False`.
             `**kwargs` (`Any`): The keyword arguments needed to build the explainer prompt.
 
         Returns:
-            `Any`: The response generated by the language model based on the built prompt.
+            `Any`: The response generated by the language model based on the built prompt, or an iterator over its chunks if `stream` is `True`.
         """
         prompt = self._build_explainer_prompt(**kwargs)
+        if stream:
+            return self.explainer.stream(prompt)
         response = self.explainer(prompt)
         return response
+
+    async def aforward(self, **kwargs: Any) -> Any:
+        """
+        Asynchronous forward pass of the Explainer. Builds the explainer prompt and awaits the language model, so other requests can proceed while it waits on the API.
+
+        Args:
+            `**kwargs` (`Any`): The keyword arguments needed to build the explainer prompt.
+
+        Returns:
+            `Any`: The response generated by the language model based on the built prompt.
+        """
+        prompt = self._build_explainer_prompt(**kwargs)
+        response = await self.explainer.acall(prompt)
+        return response
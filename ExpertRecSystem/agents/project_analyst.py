@@ -68,16 +68,33 @@ class ProjectAnalyst(Agent):
 
         return prompt
 
-    def forward(self, **kwargs: Any) -> Any:
+    def forward(self, stream: bool = False, **kwargs: Any) -> Any:
         """
         Forward pass of the ProjectAnalyst. Builds the project prompt and processes it with the language model.
 
         Args:
+            `stream` (`bool`, optional): Whether to stream the response. Defaults to `False`.
             `**kwargs` (`Any`): The keyword arguments needed to build the project prompt.
 
         Returns:
-            `Any`: The response generated by the language model based on the built prompt.
+            `Any`: The response generated by the language model based on the built prompt, or an iterator over its chunks if `stream` is `True`.
         """
         prompt = self._build_project_prompt(**kwargs)
+        if stream:
+            return self.project_analyst.stream(prompt)
         response = self.project_analyst(prompt)
         return response
+
+    async def aforward(self, **kwargs: Any) -> Any:
+        """
+        Asynchronous forward pass of the ProjectAnalyst. Builds the project prompt and awaits the language model, so other requests can proceed while it waits on the API.
+
+        Args:
+            `**kwargs` (`Any`): The keyword arguments needed to build the project prompt.
+
+        Returns:
+            `Any`: The response generated by the language model based on the built prompt.
+        """
+        prompt = self._build_project_prompt(**kwargs)
+        response = await self.project_analyst.acall(prompt)
+        return response
@@ -1,4 +1,5 @@
 from langchain.prompts import PromptTemplate
+from loguru import logger
 from typing import Any
 from ExpertRecSystem.agents.base import Agent
 from ExpertRecSystem.utils import read_json
@@ -10,6 +11,9 @@ class Recommender(Agent):
     It initializes the language model based on a configuration file and builds prompts for generating recommendations.
     """
 
+    # Expert fields shown to the LLM
+    expert_fields = ["expert_name", "specialist", "similarity", "description"]
+
     def __init__(self, config_path: str, *args, **kwargs) -> None:
         """
         Initialize the Recommender with the specified configuration file.
@@ -21,8 +25,10 @@ class Recommender(Agent):
         """
         super().__init__(*args, **kwargs)
         config = read_json(config_path)
+        prompt_budget = config.pop("prompt_budget", None)
         self.recommender = self.get_LLM(config=config)
         self.json_mode = self.recommender.json_mode
+        self.budget = self.get_prompt_budget(self.recommender, prompt_budget)
 
     @property
     def recommender_prompt(self) -> PromptTemplate:
@@ -53,7 +59,7 @@ class Recommender(Agent):
 
         Args:
             `project` (`str`): The name or description of the project.
-            `experts` (`list`): A list of expert descriptions.
+            `experts` (`list[dict]`): The experts, compacted to `expert_fields` within the prompt budget.
 
         Returns:
             `str`: The formatted prompt string ready for generating recommendations.
@@ -64,9 +70,8 @@ class Recommender(Agent):
             example=self.recommender_example,
             project=project,
         )
-        for i, des in enumerate(experts, start=1):
-            prompt += f"\n专家{i}:{des}\n"
-
+        prompt, stats = self.budget.build(prompt, experts, self.expert_fields)
+        logger.debug(f"Recommender prompt tokens: {stats}")
         return prompt
 
     def forward(self, **kwargs: Any) -> Any:
@@ -82,3 +87,17 @@ class Recommender(Agent):
         prompt = self._build_recommender_prompt(**kwargs)
         response = self.recommender(prompt)
         return response
+
+    async def aforward(self, **kwargs: Any) -> Any:
+        """
+        Asynchronous forward pass of the Recommender. Builds the recommender prompt and awaits the language model, so other requests can proceed while it waits on the API.
+
+        Args:
+            `**kwargs` (`Any`): The keyword arguments needed to build the recommender prompt.
+
+        Returns:
+            `Any`: The response generated by the language model based on the built prompt.
+        """
+        prompt = self._build_recommender_prompt(**kwargs)
+        response = await self.recommender.acall(prompt)
+        return response
@@ -1,46 +1,114 @@
-import pandas as pd
-from tqdm import tqdm
+import os
+import hashlib
+import argparse
 from ExpertRecSystem.utils import (
     read_json,
     read_expert_data,
     init_openai_api,
     read_prompts,
+    BatchRunner,
 )
 from ExpertRecSystem.agents.expert_analyst import ExpertAnalyst
 
 
+def get_expert_key(row: dict) -> str:
+    """
+    Get the checkpoint key of an expert: the expert ID and a hash of the analysed inputs, so an expert is analysed again only when its review history changes.
+
+    Args:
+        `row` (`dict`): The expert data row.
+
+    Returns:
+        `str`: The key.
+    """
+    inputs = "\x1f".join(
+        str(row[column])
+        for column in [
+            "expert_name",
+            "specialist",
+            "history_item_name",
+            "history_item_info",
+        ]
+    )
+    digest = hashlib.sha256(inputs.encode("utf-8")).hexdigest()[:16]
+    return f"{row['expert_id']}:{digest}"
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", type=str, default="data/raw/train_data.csv")
+    parser.add_argument(
+        "--output_path", type=str, default="data/processed/expert_analysis.csv"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="Experts analysed concurrently"
+    )
+    parser.add_argument(
+        "--retry",
+        action="store_true",
+        help="Only rerun the experts that failed in the last run",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="Analyse several experts per call, see the packing section of the agent config",
+    )
+    args = parser.parse_args()
 
+    # API calls are throttled by the rate_limit section of the config
     init_openai_api(read_json("config/openai-api.json"))
     prompt = read_prompts("config/prompts/agent_prompt/expert_analyst.json")
     model_config_path = "config/agents/expert_analyst.json"
-    expert_data = read_expert_data("data/raw/train_data.csv")
-    results = []
+    expert_data = read_expert_data(args.data_path)
     expert_analyst = ExpertAnalyst(model_config_path, prompts=prompt)
-    for _, row in tqdm(
-        expert_data.iterrows(), total=len(expert_data), desc="Processing experts"
-    ):
-        expert_id = row["expert_id"]
-        expert_name = row["expert_name"]
-        specialty = row["specialist"]
-        projects = row["history_item_name"].split("\n")
-        project_infos = row["history_item_info"].split("\n")
-
-        analysis = expert_analyst(
-            expert_name=expert_name,
-            specialty=specialty,
-            projects=projects,
-            project_infos=project_infos,
-        )
-        results.append(
-            {
-                "expert_id": expert_id,
-                "expert_name": expert_name,
-                "specialist": specialty,
-                "description": analysis,
-            }
-        )
-    df = pd.DataFrame(results)
-    file_path = "data/processed/expert_analysis.csv"
-    df.to_csv(file_path, index=False)
-    print(f"expert analysis saved to {file_path}")
+
+    def to_expert(row: dict) -> dict:
+        return {
+            "expert_id": row["expert_id"],
+            "expert_name": row["expert_name"],
+            "specialty": row["specialist"],
+            "projects": row["history_item_name"].split("\n"),
+            "project_infos": row["history_item_info"].split("\n"),
+        }
+
+    def to_record(row: dict, analysis: str) -> dict:
+        return {
+            "expert_id": row["expert_id"],
+            "expert_name": row["expert_name"],
+            "specialist": row["specialist"],
+            "description": analysis,
+        }
+
+    def analyze_expert(row: dict) -> dict:
+        expert = to_expert(row)
+        del expert["expert_id"]
+        return to_record(row, expert_analyst(**expert))
+
+    def pack_rows(rows: list[dict]) -> list[list[dict]]:
+        packs = expert_analyst.pack([{**to_expert(row), "row": row} for row in rows])
+        return [[expert["row"] for expert in pack] for pack in packs]
+
+    def analyze_pack(rows: list[dict]) -> list[dict]:
+        analyses = expert_analyst.forward_packed([to_expert(row) for row in rows])
+        return [to_record(row, analyses[str(row["expert_id"])]) for row in rows]
+
+    # Every analysis is checkpointed as it completes, a rerun skips finished experts
+    runner = BatchRunner(
+        os.path.splitext(args.output_path)[0] + ".jsonl",
+        workers=args.workers,
+        desc="Processing experts",
+    )
+    rows = expert_data.to_dict("records")
+    if args.retry:
+        pending = [failure["item"] for failure in runner.read_failures()]
+    else:
+        pending = rows
+    # Packed and single runs share the checkpoint keys, so either can resume the other
+    if args.pack:
+        stats = runner.run(pending, analyze_pack, key=get_expert_key, pack=pack_rows)
+    else:
+        stats = runner.run(pending, analyze_expert, key=get_expert_key)
+    runner.to_csv(args.output_path, keys=[get_expert_key(row) for row in rows])
+    print(f"expert analysis saved to {args.output_path}")
+    if stats["failed"]:
+        print(f"Failed experts saved to {runner.retry_path}, rerun with --retry")
@@ -1,10 +1,24 @@
 import torch
 import faiss
 import os
+import json
+import hashlib
 import numpy as np
 import pandas as pd
+import multiprocessing as mp
 from tqdm import tqdm
+from loguru import logger
+from typing import Callable, Optional
+from argparse import ArgumentParser
 from transformers import AutoTokenizer, AutoModel
+from ExpertRecSystem.utils import (
+    read_json,
+    EmbeddingStore,
+    get_model_version,
+    get_batch_embeddings,
+    add_experts,
+    build_faiss_index,
+)
 
 
 def read_expert(data_path: str) -> pd.Series:
@@ -15,47 +29,191 @@ def read_expert(data_path: str) -> pd.Series:
         `data_path` (`str`): The path to the CSV file containing expert data.
 
     Returns:
-        `pd.Series`: A pandas Series containing the generated text descriptions for each expert.
+        `pd.Series`: A pandas Series containing the generated text descriptions for each expert, indexed by `expert_id`.
     """
     data = pd.read_csv(data_path, encoding="utf-8")
     data = data.fillna("")  # Replace NaN values with empty strings
     data["expert_text"] = data.apply(
         build_expert_text, axis=1
     )  # Generate expert descriptions
-    return data["expert_text"]
+    return data.set_index("expert_id")["expert_text"]
 
 
 def get_embedding(
-    texts: pd.Series, tokenizer: AutoTokenizer, model: AutoModel
+    texts: pd.Series,
+    tokenizer: AutoTokenizer,
+    model: AutoModel,
+    device: Optional[torch.device] = None,
+    batch_size: int = 32,
 ) -> np.ndarray:
     """
-    Generate embeddings for a list of texts using a pre-trained transformer model.
+    Generate embeddings for a list of texts using a pre-trained transformer model. Texts are bucketed by token length and encoded in dynamically padded batches.
 
     Args:
         `texts` (`pd.Series`): A pandas Series containing text descriptions of experts.
         `tokenizer` (`AutoTokenizer`): A tokenizer from the transformers library for processing text.
         `model` (`AutoModel`): A pre-trained transformer model from the transformers library.
+        `device` (`Optional[torch.device]`): The device on which the model will run. Defaults to CUDA if available, otherwise CPU.
+        `batch_size` (`int`, optional): The number of texts per forward pass. Defaults to 32.
 
     Returns:
         `np.ndarray`: A numpy array containing the generated embeddings.
     """
-    embeddings = []
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)  # Move model to the specified device (GPU or CPU)
-    for text in tqdm(texts, desc="Generating embeddings"):
-        inputs = tokenizer(
-            text, return_tensors="pt", padding=True, truncation=True, max_length=512
-        ).to(device)
-        with torch.no_grad():  # Disable gradient calculation for inference
-            outputs = model(**inputs)
-        embedding = (
-            outputs.last_hidden_state[:, 0, :].cpu().numpy()
-        )  # Extract the embedding
-        embedding = embedding / np.linalg.norm(
-            embedding, axis=1, keepdims=True
-        )  # Normalize the embedding
-        embeddings.append(embedding)
-
-    return np.vstack(embeddings)  # Combine all embeddings into a single numpy array
+    model.eval()
+    return get_batch_embeddings(
+        texts.tolist(),
+        tokenizer,
+        model,
+        device,
+        batch_size=batch_size,
+        show_progress=True,
+    )
+
+
+_worker_tokenizer = None
+_worker_model = None
+
+
+def _init_worker(model_path: str, threads: int) -> None:
+    """
+    Load the tokenizer and model once per worker process of the parallel build.
+
+    Args:
+        `model_path` (`str`): The path to the pre-trained model.
+        `threads` (`int`): The number of intra-op threads of the worker.
+    """
+    global _worker_tokenizer, _worker_model
+    torch.set_num_threads(threads)
+    _worker_tokenizer = AutoTokenizer.from_pretrained(model_path)
+    _worker_model = AutoModel.from_pretrained(model_path).eval()
+
+
+def _embed_shard(task: tuple[str, list[str], int]) -> str:
+    """
+    Embed one shard of expert texts in a worker process and write it to disk atomically.
+
+    Args:
+        `task` (`tuple[str, list[str], int]`): The shard path, the shard texts and the batch size.
+
+    Returns:
+        `str`: The shard path.
+    """
+    shard_path, texts, batch_size = task
+    embeddings = get_batch_embeddings(
+        texts, _worker_tokenizer, _worker_model, torch.device("cpu"), batch_size
+    )
+    tmp_path = shard_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, embeddings)
+    os.replace(tmp_path, shard_path)  # A shard on disk is always complete
+    return shard_path
+
+
+def get_embedding_parallel(
+    texts: pd.Series,
+    model_path: str,
+    shard_dir: str,
+    num_workers: int = 4,
+    threads_per_worker: int = 1,
+    batch_size: int = 32,
+    shard_size: int = 1024,
+) -> np.ndarray:
+    """
+    Generate embeddings with several CPU worker processes. The texts are split into contiguous shards, each worker writes finished shards to `shard_dir`, and the shards are merged in the original order. Shards that are already on disk are reused, so a killed build resumes where it stopped.
+
+    Args:
+        `texts` (`pd.Series`): A pandas Series containing text descriptions of experts.
+        `model_path` (`str`): The path to the pre-trained model.
+        `shard_dir` (`str`): The directory for the partial embedding shards.
+        `num_workers` (`int`, optional): The number of worker processes. Defaults to 4.
+        `threads_per_worker` (`int`, optional): The number of intra-op threads per worker. Defaults to 1.
+        `batch_size` (`int`, optional): The number of texts per forward pass. Defaults to 32.
+        `shard_size` (`int`, optional): The number of texts per shard. Defaults to 1024.
+
+    Returns:
+        `np.ndarray`: A numpy array containing the generated embeddings.
+    """
+    texts = texts.tolist()
+    os.makedirs(shard_dir, exist_ok=True)
+    # Shards from a build over different texts or shard sizes cannot be reused
+    fingerprint = hashlib.sha256(
+        json.dumps([model_path, shard_size, texts], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            if json.load(f).get("fingerprint") != fingerprint:
+                for name in os.listdir(shard_dir):
+                    if name.startswith("shard_"):
+                        os.remove(os.path.join(shard_dir, name))
+    with open(manifest_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "num_texts": len(texts)}, f)
+
+    shard_paths = [
+        os.path.join(shard_dir, f"shard_{begin // shard_size:05d}.npy")
+        for begin in range(0, len(texts), shard_size)
+    ]
+    tasks = [
+        (path, texts[i * shard_size : (i + 1) * shard_size], batch_size)
+        for i, path in enumerate(shard_paths)
+        if not os.path.exists(path)
+    ]
+    logger.info(
+        f"{len(shard_paths) - len(tasks)}/{len(shard_paths)} embedding shards already built"
+    )
+    if len(tasks) > 0:
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(
+            min(num_workers, len(tasks)),
+            initializer=_init_worker,
+            initargs=(model_path, threads_per_worker),
+        ) as pool:
+            for _ in tqdm(
+                pool.imap_unordered(_embed_shard, tasks),
+                total=len(tasks),
+                desc="Generating embedding shards",
+            ):
+                pass
+    return np.vstack([np.load(path) for path in shard_paths])
+
+
+def get_embedding_incremental(
+    texts: pd.Series,
+    store: EmbeddingStore,
+    embed: Callable[[pd.Series], np.ndarray],
+) -> np.ndarray:
+    """
+    Generate embeddings, reusing those of unchanged texts from the embedding store. Only new or changed texts are passed to `embed`, each distinct text once. The store is saved with exactly the embeddings of `texts` afterwards.
+
+    Args:
+        `texts` (`pd.Series`): A pandas Series containing text descriptions of experts.
+        `store` (`EmbeddingStore`): The persistent embedding store.
+        `embed` (`Callable[[pd.Series], np.ndarray]`): Embeds the new or changed texts, e.g. `get_embedding` or `get_embedding_parallel` with their other arguments bound.
+
+    Returns:
+        `np.ndarray`: A numpy array containing the embeddings, one row per text.
+    """
+    keys = [store.key(text) for text in texts]
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in missing and store.get(key) is None:
+            missing[key] = text
+    reused = sum(1 for key in keys if key not in missing)
+    logger.info(
+        f"Reusing {reused}/{len(keys)} stored embeddings, computing {len(missing)}"
+    )
+    if len(missing) > 0:
+        embeddings = embed(pd.Series(list(missing.values())))
+        for key, embedding in zip(missing, embeddings):
+            store.put(key, embedding)
+    store.save(keep=keys)
+    logger.info(
+        f"Embeddings reused: {reused}, computed: {len(missing)}, store size: {len(store)}"
+    )
+    return np.stack([store.get(key) for key in keys])
 
 
 def build_expert_text(row: pd.Series) -> str:
@@ -83,40 +241,98 @@ def build_expert_text(row: pd.Series) -> str:
     return expert_text
 
 
-def save_to_faiss(embeddings: np.ndarray, index_path: str) -> None:
+def save_to_faiss(
+    embeddings: np.ndarray,
+    index_path: str,
+    expert_ids: Optional[np.ndarray] = None,
+    index_config: Optional[dict] = None,
+) -> None:
     """
     Save the generated embeddings to a FAISS index file for efficient similarity search.
 
     Args:
         `embeddings` (`np.ndarray`): A numpy array containing the generated embeddings.
         `index_path` (`str`): The path where the FAISS index will be saved.
+        `expert_ids` (`Optional[np.ndarray]`): The expert IDs of the embeddings. If given, the index is keyed by `expert_id` so that experts can later be added, updated or removed individually. Defaults to `None`.
+        `index_config` (`Optional[dict]`): The `index` section of the recall config selecting the index family and its build parameters. Defaults to an exact flat index.
     """
     os.makedirs(
         os.path.dirname(index_path), exist_ok=True
     )  # Ensure the directory exists
     dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(
-        dimension
+    index = build_faiss_index(
+        dimension, index_config, num_vectors=embeddings.shape[0]
     )  # Create a FAISS index for cosine similarity search
-    index.add(embeddings)  # Add embeddings to the index
+    if not index.is_trained:
+        index.train(embeddings)  # Learn the coarse quantizer (and PQ codebooks)
+    if expert_ids is not None:
+        index = faiss.IndexIDMap2(index)  # Key the vectors by expert_id
+        add_experts(index, embeddings, expert_ids)
+    else:
+        index.add(embeddings)  # Add embeddings to the index
     faiss.write_index(index, index_path)  # Save the index to a file
 
 
 if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of CPU worker processes, 1 embeds in this process",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Intra-op threads per worker process"
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=32, help="Number of texts per forward pass"
+    )
+    parser.add_argument(
+        "--shard_dir",
+        default="data/processed/embedding_shards",
+        help="Directory for partial embedding shards of the parallel build",
+    )
+    parser.add_argument(
+        "--store_dir",
+        default="data/processed/expert_embeddings",
+        help="Directory of the content-hash embedding store reused across builds",
+    )
+    args = parser.parse_args()
+
     # Define paths and device
     data_path = "data/raw/all_data.csv"
     model_path = "config/bge-m3"
     index_path = "data/processed/faiss_index_all"
+    index_config = read_json("config/systems/recall.json").get("index")
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    # Load tokenizer and model from pre-trained model path
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModel.from_pretrained(model_path)
-
-    # Read expert data and generate embeddings
+    # Read expert data and generate embeddings, reusing those of unchanged experts
     data = read_expert(data_path)
-    embeddings = get_embedding(data, tokenizer, model)
+    store = EmbeddingStore(
+        args.store_dir, model_id=f"{model_path}@{get_model_version(model_path)}"
+    )
+    if args.workers > 1:
+
+        def embed(texts: pd.Series) -> np.ndarray:
+            return get_embedding_parallel(
+                texts,
+                model_path,
+                args.shard_dir,
+                num_workers=args.workers,
+                threads_per_worker=args.threads,
+                batch_size=args.batch_size,
+            )
+
+    else:
+
+        def embed(texts: pd.Series) -> np.ndarray:
+            # Load tokenizer and model from pre-trained model path
+            tokenizer = AutoTokenizer.from_pretrained(model_path)
+            model = AutoModel.from_pretrained(model_path)
+            return get_embedding(texts, tokenizer, model, device, args.batch_size)
+
+    embeddings = get_embedding_incremental(data, store, embed)
 
     # Save embeddings to FAISS index
-    save_to_faiss(embeddings, index_path)
+    save_to_faiss(embeddings, index_path, data.index.values, index_config)
     print(f"FAISS index saved to {index_path}")
@@ -0,0 +1,23 @@
+from argparse import ArgumentParser
+from ExpertRecSystem.utils import read_json, export_onnx_model
+
+if __name__ == "__main__":
+    recall_config = read_json("config/systems/recall.json")
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--model_path",
+        default=recall_config["emb_model_path"],
+        help="Transformers embedding model to export",
+    )
+    parser.add_argument(
+        "--output_dir",
+        default="data/processed/bge-m3-onnx",
+        help="Directory for the exported ONNX model",
+    )
+    parser.add_argument(
+        "--quantize", action="store_true", help="Also write a dynamic int8 model"
+    )
+    args = parser.parse_args()
+
+    onnx_path = export_onnx_model(args.model_path, args.output_dir, args.quantize)
+    print(f"ONNX model saved to {onnx_path}")
@@ -0,0 +1,139 @@
+import os
+import torch
+import faiss
+import numpy as np
+import pandas as pd
+from argparse import ArgumentParser
+from transformers import AutoTokenizer, AutoModel
+from ExpertRecSystem.utils import (
+    read_json,
+    read_expert_data,
+    load_faiss_index,
+    is_id_mapped,
+    supports_removal,
+    get_indexed_ids,
+    remove_experts,
+    upsert_experts,
+)
+from ExpertRecSystem.dataset.expert_vectors import build_expert_text, get_embedding
+
+
+def read_delta(delta_path: str) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Read a delta CSV of changed experts. The CSV has the same columns as the expert data, plus an optional `action` column. Rows whose `action` is `delete` only need an `expert_id`; all other rows are added or updated.
+
+    Args:
+        `delta_path` (`str`): The path to the delta CSV file.
+
+    Returns:
+        `tuple[pd.DataFrame, np.ndarray]`: A tuple containing:
+            - `upserts` (`pd.DataFrame`): The experts to add or update.
+            - `deletes` (`np.ndarray`): The expert IDs to remove.
+    """
+    delta = pd.read_csv(delta_path, encoding="utf-8").fillna("")
+    if "action" not in delta.columns:
+        delta["action"] = ""
+    is_delete = delta["action"].astype(str).str.lower() == "delete"
+    deletes = delta.loc[is_delete, "expert_id"].values
+    upserts = delta.loc[~is_delete]
+    return upserts, deletes
+
+
+def update_descriptions(
+    description_path: str, upserts: pd.DataFrame, deletes: np.ndarray
+) -> int:
+    """
+    Apply a delta to the expert description store used for recall metadata. Deleted experts are dropped and the name and specialty of updated experts are refreshed. New experts get an empty description until `expert_analysis.py` is rerun for them.
+
+    Args:
+        `description_path` (`str`): The path to the expert description CSV.
+        `upserts` (`pd.DataFrame`): The experts to add or update.
+        `deletes` (`np.ndarray`): The expert IDs to remove.
+
+    Returns:
+        `int`: The number of new experts that still need a description.
+    """
+    descriptions = read_expert_data(description_path).set_index("expert_id", drop=False)
+    descriptions = descriptions.drop(index=deletes, errors="ignore")
+    columns = ["expert_id", "expert_name", "specialist"]
+    changes = upserts[columns].set_index("expert_id", drop=False)
+    existing = changes.index.isin(descriptions.index)
+    descriptions.update(changes[existing])
+    new_experts = changes[~existing].assign(description="")
+    descriptions = pd.concat([descriptions, new_experts])
+    pending = len(new_experts)
+    tmp_path = description_path + ".tmp"
+    descriptions.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, description_path)
+    return pending
+
+
+if __name__ == "__main__":
+    recall_config = read_json("config/systems/recall.json")
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--delta_path", required=True, help="CSV of experts to add, update or delete"
+    )
+    parser.add_argument(
+        "--index_path",
+        default=recall_config["index_path"],
+        help="Existing FAISS index keyed by expert_id",
+    )
+    parser.add_argument(
+        "--model_path",
+        default=recall_config["emb_model_path"],
+        help="Embedding model used to build the index",
+    )
+    parser.add_argument(
+        "--description_path",
+        default=recall_config["description_path"],
+        help="Expert description CSV that provides the recall metadata",
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=32, help="Number of texts per forward pass"
+    )
+    args = parser.parse_args()
+
+    index = load_faiss_index(args.index_path)
+    if not is_id_mapped(index):
+        raise ValueError(
+            f"{args.index_path} is not keyed by expert_id, rebuild it with expert_vectors.py first."
+        )
+    upserts, deletes = read_delta(args.delta_path)
+    # Fail before loading the embedding model if the index cannot apply the delta
+    if not supports_removal(index):
+        indexed = np.intersect1d(
+            get_indexed_ids(index),
+            np.concatenate([deletes, upserts["expert_id"].values]),
+        )
+        if len(indexed) > 0:
+            raise ValueError(
+                f"{args.index_path} does not support removal (HNSW), so experts "
+                f"{indexed.tolist()} cannot be updated or deleted. Rebuild it with "
+                "expert_vectors.py instead."
+            )
+
+    removed = remove_experts(index, deletes) if len(deletes) > 0 else 0
+    replaced = 0
+    if len(upserts) > 0:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+        model = AutoModel.from_pretrained(args.model_path)
+        texts = upserts.apply(build_expert_text, axis=1)
+        embeddings = get_embedding(texts, tokenizer, model, device, args.batch_size)
+        replaced = upsert_experts(index, embeddings, upserts["expert_id"].values)
+
+    # Write next to the old index first so readers never see a partial file
+    tmp_path = args.index_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, args.index_path)
+    pending = update_descriptions(args.description_path, upserts, deletes)
+    if pending > 0:
+        print(
+            f"{pending} new experts have no description yet, "
+            "rerun expert_analysis.py to describe them"
+        )
+    print(
+        f"Removed {removed}, updated {replaced}, added {len(upserts) - replaced} experts; "
+        f"{index.ntotal} experts in {args.index_path}"
+    )
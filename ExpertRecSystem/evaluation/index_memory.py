@@ -0,0 +1,121 @@
+import time
+import multiprocessing as mp
+import numpy as np
+from argparse import ArgumentParser
+from ExpertRecSystem.utils import read_json, load_faiss_index
+
+
+def read_memory() -> dict[str, int]:
+    """
+    Read the memory usage of the current process from `/proc` (Linux only).
+
+    Returns:
+        `dict[str, int]`: The resident (`rss`), anonymous (`anon`), file-backed (`file`) and proportional (`pss`) set sizes in kB. `pss` splits shared pages between the processes mapping them, so summing it over workers gives their real memory cost.
+    """
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            for key, field in [
+                ("rss", "VmRSS"),
+                ("anon", "RssAnon"),
+                ("file", "RssFile"),
+            ]:
+                if line.startswith(field + ":"):
+                    memory[key] = int(line.split()[1])
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                memory["pss"] = int(line.split()[1])
+    return memory
+
+
+def worker(index_path: str, index_type: str, mmap: bool, barrier, queue) -> None:
+    """
+    Load the index, run one query so the pages it touches are resident, then report memory once every worker is loaded.
+
+    Args:
+        `index_path` (`str`): The path to the FAISS index file.
+        `index_type` (`str`): The index family, which selects the mapping mode.
+        `mmap` (`bool`): Whether to memory-map the index.
+        `barrier` (`multiprocessing.Barrier`): Keeps all workers alive while memory is measured.
+        `queue` (`multiprocessing.Queue`): Receives the measurement.
+    """
+    before = read_memory()
+    start = time.perf_counter()
+    index = load_faiss_index(index_path, {"type": index_type}, mmap=mmap)
+    load_time = time.perf_counter() - start
+    query = np.random.rand(1, index.d).astype(np.float32)
+    index.search(query, 10)
+    barrier.wait()
+    after = read_memory()
+    queue.put(
+        {
+            "load_time": load_time,
+            **{key: after[key] - before[key] for key in after},
+        }
+    )
+    barrier.wait()
+
+
+def measure(index_path: str, index_type: str, mmap: bool, workers: int) -> list[dict]:
+    """
+    Load the index in several processes at once and collect their memory usage.
+
+    Args:
+        `index_path` (`str`): The path to the FAISS index file.
+        `index_type` (`str`): The index family, which selects the mapping mode.
+        `mmap` (`bool`): Whether to memory-map the index.
+        `workers` (`int`): The number of worker processes.
+
+    Returns:
+        `list[dict]`: One measurement per worker.
+    """
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(index_path, index_type, mmap, barrier, queue))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in range(workers)]
+    for process in processes:
+        process.join()
+    return results
+
+
+if __name__ == "__main__":
+    recall_config = read_json("config/systems/recall.json")
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--index_path",
+        default=recall_config["index_path"],
+        help="FAISS index to measure",
+    )
+    parser.add_argument(
+        "--index_type",
+        default=recall_config.get("index", {}).get("type", "flat"),
+        choices=["flat", "ivf", "hnsw", "ivfpq"],
+        help="Family of the index, selects the mapping mode",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Number of processes sharing the host"
+    )
+    args = parser.parse_args()
+
+    print(f"Index: {args.index_path} ({args.index_type}), workers: {args.workers}")
+    print(
+        f"{'mode':<8}{'load (s)':>10}{'RSS (MB)':>12}{'anon (MB)':>12}"
+        f"{'file (MB)':>12}{'PSS (MB)':>12}{'total PSS (MB)':>16}"
+    )
+    for mmap in [False, True]:
+        results = measure(args.index_path, args.index_type, mmap, args.workers)
+        mean = {key: np.mean([r[key] for r in results]) for key in results[0]}
+        total_pss = sum(r["pss"] for r in results)
+        print(
+            f"{'mmap' if mmap else 'read':<8}{mean['load_time']:>10.3f}"
+            f"{mean['rss'] / 1024:>12.1f}{mean['anon'] / 1024:>12.1f}"
+            f"{mean['file'] / 1024:>12.1f}{mean['pss'] / 1024:>12.1f}"
+            f"{total_pss / 1024:>16.1f}"
+        )
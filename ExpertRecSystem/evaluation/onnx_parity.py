@@ -0,0 +1,94 @@
+import time
+import faiss
+import torch
+import numpy as np
+from argparse import ArgumentParser
+from transformers import AutoTokenizer, AutoModel
+from ExpertRecSystem.utils import read_json, get_batch_embeddings, OnnxEmbeddingModel
+from ExpertRecSystem.dataset.expert_vectors import read_expert
+
+
+def embed(
+    texts: list[str], tokenizer, model, batch_size: int
+) -> tuple[np.ndarray, float]:
+    """
+    Embed the texts on CPU and measure the wall time.
+
+    Args:
+        `texts` (`list[str]`): The texts to embed.
+        `tokenizer`: The tokenizer of the embedding model.
+        `model`: The PyTorch or ONNX embedding model.
+        `batch_size` (`int`): The number of texts per forward pass.
+
+    Returns:
+        `tuple[np.ndarray, float]`: The embeddings and the elapsed seconds.
+    """
+    start = time.perf_counter()
+    embeddings = get_batch_embeddings(
+        texts, tokenizer, model, torch.device("cpu"), batch_size=batch_size
+    )
+    return embeddings, time.perf_counter() - start
+
+
+def nearest_neighbors(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Find the nearest other expert of every expert with an exact inner-product search.
+
+    Args:
+        `embeddings` (`np.ndarray`): The normalized expert embeddings.
+
+    Returns:
+        `np.ndarray`: The position of the nearest other expert for every expert.
+    """
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    _, indices = index.search(embeddings, 2)
+    # The best hit is usually the expert itself, unless a duplicate ties with it
+    is_self = indices[:, 0] == np.arange(len(embeddings))
+    return np.where(is_self, indices[:, 1], indices[:, 0])
+
+
+if __name__ == "__main__":
+    recall_config = read_json("config/systems/recall.json")
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--onnx_path",
+        default=recall_config["onnx"]["model_path"],
+        help="ONNX model to compare against the PyTorch model",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Only compare the first N experts"
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=32, help="Number of texts per forward pass"
+    )
+    args = parser.parse_args()
+
+    texts = read_expert(recall_config["data_path"]).tolist()[: args.limit]
+    tokenizer = AutoTokenizer.from_pretrained(recall_config["emb_model_path"])
+    torch_model = AutoModel.from_pretrained(recall_config["emb_model_path"]).eval()
+    onnx_model = OnnxEmbeddingModel(
+        args.onnx_path, recall_config["onnx"].get("num_threads")
+    )
+
+    torch_embeddings, torch_time = embed(texts, tokenizer, torch_model, args.batch_size)
+    onnx_embeddings, onnx_time = embed(texts, tokenizer, onnx_model, args.batch_size)
+
+    # Both embeddings are normalized, so the row-wise dot product is the cosine
+    cosine = np.sum(torch_embeddings * onnx_embeddings, axis=1)
+    # Agreement of the nearest other expert of every expert under both backends
+    torch_neighbors = nearest_neighbors(torch_embeddings)
+    onnx_neighbors = nearest_neighbors(onnx_embeddings)
+
+    print(f"Experts compared: {len(texts)}")
+    print(
+        f"Cosine agreement: mean {cosine.mean():.6f}, min {cosine.min():.6f}, "
+        f"p1 {np.percentile(cosine, 1):.6f}"
+    )
+    print(
+        f"Nearest-neighbour agreement: {np.mean(torch_neighbors == onnx_neighbors):.4f}"
+    )
+    print(
+        f"PyTorch: {len(texts) / torch_time:.1f} texts/s, "
+        f"ONNX: {len(texts) / onnx_time:.1f} texts/s"
+    )
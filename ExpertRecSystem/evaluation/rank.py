@@ -1,10 +1,12 @@
+import os
 import torch
+import argparse
 import pandas as pd
-from tqdm import tqdm
 import logging
+import threading
 from datetime import datetime
 from ExpertRecSystem.system import CollaborationSystem
-from ExpertRecSystem.utils import init_openai_api, read_json
+from ExpertRecSystem.utils import init_openai_api, read_json, BatchRunner
 
 current_time = datetime.now().strftime("%Y-%m-%d:%H:%M:%S")
 log_filename = f"logs/sort_{current_time}.log"
@@ -17,43 +19,64 @@ logging.basicConfig(
 )
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", type=str, default="data/raw/test_data.csv")
+    parser.add_argument(
+        "--output_path", type=str, default="data/processed/sorted_results.csv"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="Projects ranked concurrently"
+    )
+    parser.add_argument(
+        "--retry",
+        action="store_true",
+        help="Only rerun the projects that failed in the last run",
+    )
+    args = parser.parse_args()
+
     init_openai_api(read_json("config/openai-api.json"))
     system_config = "config/systems/chat.json"
-    data_path = "data/raw/test_data.csv"
-    output_path = "data/processed/sorted_results.csv"
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     system = CollaborationSystem(config_path=system_config, device=device)
-    data = pd.read_csv(data_path)
-    results = []
-
-    for _, row in tqdm(
-        data.iterrows(), total=data.shape[0], desc="Processing Projects"
-    ):
-        try:
-            project_name = row["project_name"]
-            project_info = row["project_infos"]
-            project_id = row["project_id"]
-            user_input = [project_name, project_info]
-
-            output = system(user_input, top_k=25, num=10)
+    data = pd.read_csv(args.data_path)
 
-            results.append(
-                {
-                    "project_id": project_id,
-                    "project_name": project_name,
-                    "system_output": output,
-                }
-            )
+    # Results are appended as they complete, a rerun resumes where it stopped
+    runner = BatchRunner(
+        os.path.splitext(args.output_path)[0] + ".jsonl", workers=args.workers
+    )
 
-        except Exception as e:
+    # Each worker ranks on its own copy of the system, the copies share the models
+    local = threading.local()
 
-            logging.error(f"Error processing {project_name}: {e}")
-            continue
+    def rank_project(row: dict) -> dict:
+        if not hasattr(local, "system"):
+            local.system = system.fork()
+        # Projects are independent, each starts with an empty chat history
+        local.system.reset(clear=True)
+        user_input = [row["project_name"], row["project_infos"]]
+        output = local.system(user_input, top_k=25, num=10, reset=False, explain=False)
+        return {
+            "project_id": row["project_id"],
+            "project_name": row["project_name"],
+            "system_output": output,
+        }
 
-    results_df = pd.DataFrame(results)
+    if args.retry:
+        rows = [failure["item"] for failure in runner.read_failures()]
+    else:
+        rows = data.to_dict("records")
+    stats = runner.run(rows, rank_project, key="project_id")
+    for failure in runner.read_failures():
+        logging.error(
+            f"Error processing {failure['item']['project_name']}: {failure['error']}"
+        )
 
-    results_df.to_csv(output_path, index=False, encoding="utf-8-sig")
+    runner.to_csv(
+        args.output_path, keys=data["project_id"].tolist(), encoding="utf-8-sig"
+    )
 
-    print(f"Results saved to {output_path}")
+    print(f"Results saved to {args.output_path}")
+    if stats["failed"]:
+        print(f"Failed projects saved to {runner.retry_path}, rerun with --retry")
     print(f"Logs saved to {log_filename}")
@@ -1,15 +1,22 @@
 import torch
 import sys
 import os
+import json
+import hashlib
+import time
 import pandas as pd
 import numpy as np
+from typing import Optional
 from loguru import logger
 from transformers import AutoTokenizer, AutoModel
 from ExpertRecSystem.utils import (
     read_expert_data,
+    load_embedding_model,
     load_faiss_index,
-    get_project_embedding,
-    find_similar_experts,
+    get_batch_embeddings,
+    get_search_params,
+    get_model_id,
+    is_id_mapped,
     read_json,
 )
 
@@ -22,6 +29,100 @@ logger.add(
 )  # Log to file with DEBUG level
 
 
+def get_test_embeddings(
+    project_descriptions: list[str],
+    tokenizer: AutoTokenizer,
+    model: AutoModel,
+    device: torch.device,
+    model_id: str,
+    cache_dir: Optional[str] = None,
+    batch_size: int = 32,
+) -> np.ndarray:
+    """
+    Embed the test projects with batched forward passes. The embedding matrix is cached on disk under a hash of the texts and the model identity, so evaluating a new index with the same test set and model skips the encoding entirely.
+
+    Args:
+        `project_descriptions` (`list[str]`): The textual descriptions of the test projects.
+        `tokenizer` (`AutoTokenizer`): Tokenizer for processing the project descriptions.
+        `model` (`AutoModel`): Pre-trained model for generating embeddings from project descriptions.
+        `device` (`torch.device`): The device (CPU or GPU) on which the model will run.
+        `model_id` (`str`): The identity of the embedding model, see `get_model_id`.
+        `cache_dir` (`Optional[str]`): The directory of the cached embedding matrices. Caching is disabled if `None`. Defaults to `None`.
+        `batch_size` (`int`, optional): The number of projects per forward pass. Defaults to 32.
+
+    Returns:
+        `np.ndarray`: The normalized embeddings, one row per test project.
+    """
+    if cache_dir is not None:
+        payload = json.dumps([model_id, project_descriptions], ensure_ascii=False)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{key}.npy")
+        if os.path.exists(cache_path):
+            logger.debug(f"Loaded test embeddings from {cache_path}")
+            return np.load(cache_path)
+    embeddings = get_batch_embeddings(
+        project_descriptions,
+        tokenizer,
+        model,
+        device,
+        batch_size=batch_size,
+        show_progress=True,
+    )
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, cache_path)
+        logger.debug(f"Saved test embeddings to {cache_path}")
+    return embeddings
+
+
+def compute_ranks(
+    retrieved_ids: np.ndarray, true_expert_ids: np.ndarray, top_k: int
+) -> np.ndarray:
+    """
+    Compute the rank of the true expert in every retrieved list.
+
+    Args:
+        `retrieved_ids` (`np.ndarray`): The retrieved expert IDs, one row of length `top_k` per project.
+        `true_expert_ids` (`np.ndarray`): The true expert ID of every project.
+        `top_k` (`int`): The number of retrieved experts per project.
+
+    Returns:
+        `np.ndarray`: The 1-based rank of the true expert, `top_k + 1` if it was not retrieved.
+    """
+    hits = retrieved_ids == true_expert_ids[:, None]
+    found = hits.any(axis=1)
+    return np.where(found, hits.argmax(axis=1) + 1, top_k + 1)
+
+
+def compute_metrics(ranks: np.ndarray, top_k: int, cutoffs: list[int]) -> dict:
+    """
+    Compute the retrieval metrics from the ranks of the true experts. There is one relevant expert per project, so NDCG reduces to `1 / log2(rank + 1)`.
+
+    Args:
+        `ranks` (`np.ndarray`): The 1-based ranks of the true experts, `top_k + 1` if not retrieved.
+        `top_k` (`int`): The number of retrieved experts per project.
+        `cutoffs` (`list[int]`): The cutoffs of hit@k and NDCG@k.
+
+    Returns:
+        `dict`: The hit rates (in percent) and NDCG per cutoff, MRR, NDCG and the mean rank.
+    """
+    found = ranks <= top_k
+    reciprocal_ranks = np.where(found, 1.0 / ranks, 0.0)
+    gains = np.where(found, 1.0 / np.log2(ranks + 1), 0.0)
+    return {
+        "hit_rates": {k: float(np.mean(ranks <= k) * 100) for k in cutoffs},
+        "ndcg_at": {
+            k: float(np.mean(np.where(ranks <= k, gains, 0.0))) for k in cutoffs
+        },
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "ndcg": float(np.mean(gains)),
+        "average_rank": float(np.mean(ranks)),
+    }
+
+
 def evaluate_model(
     test_data: pd.DataFrame,
     tokenizer: AutoTokenizer,
@@ -29,9 +130,15 @@ def evaluate_model(
     index,
     expert_data: pd.DataFrame,
     device: torch.device,
-):
+    search_params=None,
+    model_id: str = "",
+    cache_dir: Optional[str] = None,
+    batch_size: int = 32,
+    top_k: int = 1000,
+    cutoffs: list[int] = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100],
+) -> dict:
     """
-    Evaluate the recommendation model by comparing the predicted expert rankings against the true expert.
+    Evaluate the recommendation model by comparing the predicted expert rankings against the true expert. All test projects are embedded in batches and searched with a single multi-query FAISS search; the metrics are computed on the resulting rank matrix.
 
     Args:
         `test_data` (`pd.DataFrame`): DataFrame containing test project descriptions and true expert IDs.
@@ -40,98 +147,94 @@ def evaluate_model(
         `index` (`faiss.Index`): FAISS index containing embeddings of experts for similarity search.
         `expert_data` (`pd.DataFrame`): DataFrame containing expert data, including expert IDs.
         `device` (`torch.device`): The device (CPU or GPU) on which the model will run.
+        `search_params` (`faiss.SearchParameters`, optional): The search-time parameters of the index. Defaults to `None`.
+        `model_id` (`str`, optional): The identity of the embedding model, used to key the cached test embeddings. Defaults to `""`.
+        `cache_dir` (`Optional[str]`): The directory of the cached test embeddings. Caching is disabled if `None`. Defaults to `None`.
+        `batch_size` (`int`, optional): The number of projects per forward pass. Defaults to 32.
+        `top_k` (`int`, optional): The number of experts retrieved per project. Defaults to 1000.
+        `cutoffs` (`list[int]`, optional): The cutoffs of hit@k and NDCG@k. Defaults to 10, 20, ..., 100.
 
     Returns:
-        `tuple`: A tuple containing:
-            - `hit_rates` (`dict`): A dictionary of hit rates at different cutoff ranks (Top-10, Top-20, etc.).
-            - `average_rank` (`float`): The average rank of the true expert in the predicted list.
+        `dict`: The hit rates (in percent) and NDCG per cutoff, MRR, NDCG and the mean rank of the true expert.
     """
-    hit_counts = {10: 0, 20: 0, 30: 0, 40: 0, 50: 0, 60: 0, 70: 0, 80: 0, 90: 0, 100: 0}
-    ranks = []
-    total_count = 0
-
-    # Iterate over each project in the test data
-    for _, row in test_data.iterrows():
-        project_description = row["project_name"] + " " + row["project_infos"]
-        true_expert_id = row["expert_id"]
-
-        # Generate embedding for the project
-        project_embedding = get_project_embedding(
-            project_description, tokenizer, model, device
-        )
-
-        # Find similar experts using FAISS
-        cosine_similarities, indices = find_similar_experts(
-            project_embedding, index, top_k=1000
-        )
-
-        # Retrieve the expert IDs corresponding to the top similar experts
-        expert_ids = expert_data.iloc[indices[0]]["expert_id"].values
-
-        # Calculate hit counts for each top-k cutoff
-        for k in hit_counts.keys():
-            if true_expert_id in expert_ids[:k]:
-                hit_counts[k] += 1
-
-        # Determine the rank of the true expert
-        rank = np.where(expert_ids == true_expert_id)[0]
-        if len(rank) > 0:
-            ranks.append(rank[0] + 1)
-        else:
-            ranks.append(1001)
-
-        total_count += 1
-
-        # Log detailed debug information
-        logger.debug(f"Project: {project_description}")
-        logger.debug(f"True Expert ID: {true_expert_id}")
-        logger.debug(f"True Expert Rank: {rank}")
-        logger.debug(f"True Expert Cosine Similarity: {cosine_similarities[rank]}")
-        for idx, (expert_id, similarity) in enumerate(
-            zip(expert_ids[:5], cosine_similarities[:5])
-        ):
-            logger.debug(
-                f"Rank {idx + 1}: Expert ID: {expert_id}, Cosine Similarity: {similarity:.4f}"
-            )
-        logger.debug("")
-
-    # Calculate hit rates and average rank
-    hit_rates = {k: (hit_counts[k] / total_count) * 100 for k in hit_counts}
-    average_rank = np.mean(ranks)
+    project_descriptions = (
+        test_data["project_name"] + " " + test_data["project_infos"]
+    ).tolist()
+    true_expert_ids = test_data["expert_id"].to_numpy()
+
+    # Embed all projects, reusing the cached matrix when the model and test set are unchanged
+    embeddings = get_test_embeddings(
+        project_descriptions,
+        tokenizer,
+        model,
+        device,
+        model_id,
+        cache_dir=cache_dir,
+        batch_size=batch_size,
+    )
+
+    # Search all projects at once
+    start = time.perf_counter()
+    _, labels = index.search(embeddings, top_k, params=search_params)
+    logger.debug(
+        f"Searched {len(embeddings)} projects in {time.perf_counter() - start:.2f}s"
+    )
+
+    # Map the search results to expert IDs
+    if is_id_mapped(index):
+        retrieved_ids = labels
+    else:
+        expert_ids = expert_data["expert_id"].to_numpy()
+        retrieved_ids = np.where(labels >= 0, expert_ids[labels], -1)
+
+    ranks = compute_ranks(retrieved_ids, true_expert_ids, top_k)
+    metrics = compute_metrics(ranks, top_k, cutoffs)
 
     # Log the evaluation results
-    for k, rate in hit_rates.items():
-        logger.debug(f"Hit Rate at Top {k}: {rate:.2f}%")
-
-    logger.debug(f"Average Rank: {average_rank:.2f}")
-    logger.debug(f"Concrete Rank: {ranks}")
+    for k, rate in metrics["hit_rates"].items():
+        logger.debug(
+            f"Hit Rate at Top {k}: {rate:.2f}%, NDCG@{k}: {metrics['ndcg_at'][k]:.4f}"
+        )
+    logger.debug(f"MRR: {metrics['mrr']:.4f}")
+    logger.debug(f"NDCG: {metrics['ndcg']:.4f}")
+    logger.debug(f"Average Rank: {metrics['average_rank']:.2f}")
+    logger.debug(f"Concrete Rank: {ranks.tolist()}")
 
-    return hit_rates, average_rank
+    return metrics
 
 
 if __name__ == "__main__":
     # Load configuration and data paths
     config_path = read_json("config/systems/recall.json")
     data_path = config_path["data_path"]
-    model_path = config_path["emb_model_path"]
     index_path = config_path["index_path"]
+    index_config = config_path.get("index", {})
     test_data_path = config_path["test_data_path"]
 
     # Set up device for model inference
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    # Load tokenizer and model from pre-trained model path
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModel.from_pretrained(model_path).to(device)
+    # Load tokenizer and model with the configured embedding backend
+    tokenizer, model = load_embedding_model(config_path, device)
 
     # Load FAISS index and expert data
-    index = load_faiss_index(index_path)
+    index = load_faiss_index(index_path, index_config)
     expert_data = read_expert_data(data_path)
 
     # Load test data
     test_data = pd.read_csv(test_data_path, encoding="utf-8")
 
     # Evaluate the model
-    evaluate_model(test_data, tokenizer, model, index, expert_data, device)
+    evaluate_model(
+        test_data,
+        tokenizer,
+        model,
+        index,
+        expert_data,
+        device,
+        search_params=get_search_params(index_config),
+        model_id=get_model_id(config_path),
+        cache_dir=config_path.get("eval_cache_dir"),
+    )
 
     print(f"Evaluation completed.")
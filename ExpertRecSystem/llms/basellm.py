@@ -1,4 +1,10 @@
+import time
+import asyncio
 from abc import ABC, abstractmethod
+from typing import Iterator
+from ExpertRecSystem.llms.cache import get_llm_cache
+from ExpertRecSystem.llms.cassette import get_cassette
+from ExpertRecSystem.llms.ratelimit import get_rate_limiter
 
 
 class BaseLLM(ABC):
@@ -7,6 +13,7 @@ class BaseLLM(ABC):
         self.max_tokens: int
         self.max_context_length: int
         self.json_mode: bool
+        self.params: dict
 
     @property
     def tokens_limit(self) -> int:
@@ -17,9 +24,166 @@ class BaseLLM(ABC):
         """
         return self.max_context_length - 2 * self.max_tokens - 50
 
-    @abstractmethod
+    @property
+    def cacheable(self) -> bool:
+        """Whether the responses of the LLM are deterministic and can be served from the response cache.
+
+        Returns:
+            `bool`: Whether the LLM samples with temperature 0.
+        """
+        return self.params.get("temperature") == 0
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text. Defaults to one token per character, an upper bound for Chinese text.
+
+        Args:
+            `text` (`str`): The text.
+        Returns:
+            `int`: The number of tokens.
+        """
+        return len(text)
+
+    def estimate_tokens(self, prompt: str) -> int:
+        """Estimate the tokens a call consumes from the token rate limit of the provider: the prompt plus `max_tokens`.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Returns:
+            `int`: The estimated number of tokens.
+        """
+        return self.count_tokens(prompt) + self.max_tokens
+
+    def _get_cache(self):
+        # A cassette takes precedence: recording needs real calls, replay needs none
+        if not self.cacheable or get_cassette() is not None:
+            return None
+        return get_llm_cache()
+
     def __call__(self, prompt: str, *args, **kwargs) -> str:
-        """Forward pass of the LLM.
+        """Forward pass of the LLM. Deterministic calls are served from the response cache set by `init_openai_api` when possible, and API calls go through the shared rate limiter if one is set. With a cassette set, calls are recorded to or replayed from it instead.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Returns:
+            `str`: The LLM output.
+        """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            entry = cassette.get(self.model_name, self.params, prompt)
+            time.sleep(cassette.delay(entry))
+            return entry["response"]
+        cache = self._get_cache()
+        if cache is not None:
+            response = cache.get(self.model_name, self.params, prompt)
+            if response is not None:
+                return response
+        start = time.perf_counter()
+        limiter = get_rate_limiter()
+        if limiter is None:
+            response = self._call(prompt, *args, **kwargs)
+        else:
+            response = limiter.call(
+                self._call, self.estimate_tokens(prompt), prompt, *args, **kwargs
+            )
+        if cassette is not None:
+            cassette.record(
+                self.model_name,
+                self.params,
+                prompt,
+                response,
+                time.perf_counter() - start,
+            )
+        if cache is not None:
+            cache.put(self.model_name, self.params, prompt, response)
+        return response
+
+    async def acall(self, prompt: str, *args, **kwargs) -> str:
+        """Asynchronous forward pass of the LLM, served from the response cache or the cassette like `__call__`.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Returns:
+            `str`: The LLM output.
+        """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            entry = cassette.get(self.model_name, self.params, prompt)
+            await asyncio.sleep(cassette.delay(entry))
+            return entry["response"]
+        cache = self._get_cache()
+        if cache is not None:
+            response = cache.get(self.model_name, self.params, prompt)
+            if response is not None:
+                return response
+        start = time.perf_counter()
+        limiter = get_rate_limiter()
+        if limiter is None:
+            response = await self._acall(prompt, *args, **kwargs)
+        else:
+            response = await limiter.acall(
+                self._acall, self.estimate_tokens(prompt), prompt, *args, **kwargs
+            )
+        if cassette is not None:
+            cassette.record(
+                self.model_name,
+                self.params,
+                prompt,
+                response,
+                time.perf_counter() - start,
+            )
+        if cache is not None:
+            cache.put(self.model_name, self.params, prompt, response)
+        return response
+
+    def stream(self, prompt: str, *args, **kwargs) -> Iterator[str]:
+        """Streaming forward pass of the LLM. Yields the output chunk by chunk as it is generated. A cached response is yielded as one chunk, and a fully streamed response is stored in the cache like `__call__`. A cassette records the chunk timings and replays them.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Yields:
+            `str`: The chunks of the LLM output.
+        """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            entry = cassette.get(self.model_name, self.params, prompt)
+            for delay, chunk in cassette.chunks(entry):
+                time.sleep(delay)
+                yield chunk
+            return
+        cache = self._get_cache()
+        if cache is not None:
+            response = cache.get(self.model_name, self.params, prompt)
+            if response is not None:
+                yield response
+                return
+        start = time.perf_counter()
+        limiter = get_rate_limiter()
+        if limiter is None:
+            stream = self._stream(prompt, *args, **kwargs)
+        else:
+            stream = limiter.stream(
+                self._stream, self.estimate_tokens(prompt), prompt, *args, **kwargs
+            )
+        chunks = []
+        for chunk in stream:
+            chunks.append((time.perf_counter() - start, chunk))
+            yield chunk
+        response = "".join(chunk for _, chunk in chunks).strip()
+        if cassette is not None:
+            cassette.record(
+                self.model_name,
+                self.params,
+                prompt,
+                response,
+                time.perf_counter() - start,
+                chunks,
+            )
+        if cache is not None:
+            cache.put(self.model_name, self.params, prompt, response)
+
+    @abstractmethod
+    def _call(self, prompt: str, *args, **kwargs) -> str:
+        """Call the model without the response cache.
 
         Args:
             `prompt` (`str`): The prompt to feed into the LLM.
@@ -28,4 +192,24 @@ class BaseLLM(ABC):
         Returns:
             `str`: The LLM output.
         """
-        raise NotImplementedError("BaseLLM.__call__() not implemented")
+        raise NotImplementedError("BaseLLM._call() not implemented")
+
+    async def _acall(self, prompt: str, *args, **kwargs) -> str:
+        """Call the model asynchronously without the response cache. Runs `_call` in a worker thread unless overridden with a natively asynchronous client.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Returns:
+            `str`: The LLM output.
+        """
+        return await asyncio.to_thread(self._call, prompt, *args, **kwargs)
+
+    def _stream(self, prompt: str, *args, **kwargs) -> Iterator[str]:
+        """Stream the model output without the response cache. Yields the whole output of `_call` as one chunk unless overridden with a streaming client.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Yields:
+            `str`: The chunks of the LLM output.
+        """
+        yield self._call(prompt, *args, **kwargs)
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from loguru import logger
+from typing import Optional
+
+
+class LLMCacheMiss(KeyError):
+    """
+    Raised in `readonly` mode when a prompt has no cached response.
+    """
+
+
+class LLMCache:
+    """
+    A persistent cache of LLM responses in SQLite, keyed by the model name, the generation parameters and the full prompt. Only deterministic calls (temperature 0) are cached, see `BaseLLM`. The least recently used responses are evicted once the cached text exceeds `max_size_mb`. The cache is thread-safe and can be shared by several processes.
+
+    Modes:
+        `readwrite`: Serve hits and store the responses of misses.
+        `readonly`: Replay mode. Serve hits and raise `LLMCacheMiss` on misses, so no API call is ever made.
+    """
+
+    def __init__(
+        self, path: str, max_size_mb: float = 512, mode: str = "readwrite"
+    ) -> None:
+        """
+        Open (and create) the cache database.
+
+        Args:
+            `path` (`str`): The path to the SQLite database.
+            `max_size_mb` (`float`, optional): The maximum size of the cached prompts and responses in MB. Defaults to `512`.
+            `mode` (`str`, optional): `readwrite` or `readonly`. Defaults to `readwrite`.
+
+        Raises:
+            `ValueError`: If the mode is not supported.
+        """
+        if mode not in ["readwrite", "readonly"]:
+            raise ValueError(f"LLM cache mode {mode} is not supported.")
+        self.path = path
+        self.max_size = int(max_size_mb * 2**20)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, prompt TEXT, response TEXT, "
+            "size INTEGER, created REAL, accessed REAL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(model_name: str, params: dict, prompt: str) -> str:
+        """
+        Get the cache key of an LLM call.
+
+        Args:
+            `model_name` (`str`): The model name.
+            `params` (`dict`): The generation parameters.
+            `prompt` (`str`): The full prompt.
+
+        Returns:
+            `str`: The cache key.
+        """
+        payload = json.dumps(
+            {"model": model_name, "params": params, "prompt": prompt},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, params: dict, prompt: str) -> Optional[str]:
+        """
+        Look up the cached response of an LLM call.
+
+        Args:
+            `model_name` (`str`): The model name.
+            `params` (`dict`): The generation parameters.
+            `prompt` (`str`): The full prompt.
+
+        Returns:
+            `Optional[str]`: The cached response, or `None` on a miss in `readwrite` mode.
+
+        Raises:
+            `LLMCacheMiss`: On a miss in `readonly` mode.
+        """
+        key = self.key(model_name, params, prompt)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if self.mode == "readwrite":
+                    self._db.execute(
+                        "UPDATE responses SET accessed = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self._db.commit()
+        if row is None and self.mode == "readonly":
+            raise LLMCacheMiss(
+                f"No cached response of {model_name} for prompt {prompt[:50]!r}..."
+            )
+        return None if row is None else row[0]
+
+    def put(self, model_name: str, params: dict, prompt: str, response: str) -> None:
+        """
+        Store the response of an LLM call. Does nothing in `readonly` mode.
+
+        Args:
+            `model_name` (`str`): The model name.
+            `params` (`dict`): The generation parameters.
+            `prompt` (`str`): The full prompt.
+            `response` (`str`): The LLM response.
+        """
+        if self.mode == "readonly":
+            return
+        key = self.key(model_name, params, prompt)
+        size = len(prompt.encode("utf-8")) + len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model_name, prompt, response, size, now, now),
+            )
+            self._db.commit()
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+        # Evict down to 90% so that eviction does not run on every write
+        target = total - int(self.max_size * 0.9)
+        freed = 0
+        keys = []
+        for key, size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ):
+            if freed >= target:
+                break
+            keys.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self._db.commit()
+        self.evictions += len(keys)
+        logger.debug(f"Evicted {len(keys)} LLM responses ({freed} bytes)")
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """
+        Hit, miss and eviction counters of the cache.
+
+        Returns:
+            `dict[str, int | float]`: The counters, the number and size of the cached responses, and the hit rate.
+        """
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size": size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_llm_cache: Optional[LLMCache] = None
+
+
+def set_llm_cache(cache: Optional[LLMCache]) -> None:
+    """
+    Set the response cache shared by all LLMs of the process.
+
+    Args:
+        `cache` (`Optional[LLMCache]`): The cache, or `None` to disable caching.
+    """
+    global _llm_cache
+    _llm_cache = cache
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Get the response cache shared by all LLMs of the process.
+
+    Returns:
+        `Optional[LLMCache]`: The cache, or `None` if caching is disabled.
+    """
+    return _llm_cache
@@ -0,0 +1,181 @@
+import os
+import json
+import threading
+from collections import defaultdict
+from loguru import logger
+from typing import Optional
+from ExpertRecSystem.llms.cache import LLMCache
+
+
+class CassetteMiss(KeyError):
+    """
+    Raised in `replay` mode when a prompt was not recorded.
+    """
+
+
+class Cassette:
+    """
+    Records the LLM traffic of real runs into a JSON lines file, and serves it back offline, for reproducible end-to-end performance runs without network access. Each line holds the model, the parameters, the prompt, the response, the latency and, for streamed calls, the chunks with their offsets. A prompt recorded several times is replayed in recording order, repeating the last response.
+
+    Modes:
+        `record`: Call the API and append every call to the cassette.
+        `replay`: Serve every call from the cassette and raise `CassetteMiss` on unrecorded prompts, so no API call is ever made.
+
+    Latency:
+        `instant`: Replay without waiting.
+        `recorded`: Replay with the recorded latency, and the recorded chunk timings for streamed calls.
+    """
+
+    def __init__(
+        self, path: str, mode: str = "replay", latency: str = "recorded"
+    ) -> None:
+        """
+        Open the cassette.
+
+        Args:
+            `path` (`str`): The path to the cassette file.
+            `mode` (`str`, optional): `record` or `replay`. Defaults to `replay`.
+            `latency` (`str`, optional): `instant` or `recorded`. Defaults to `recorded`.
+
+        Raises:
+            `ValueError`: If the mode or the latency is not supported.
+        """
+        if mode not in ["record", "replay"]:
+            raise ValueError(f"Cassette mode {mode} is not supported.")
+        if latency not in ["instant", "recorded"]:
+            raise ValueError(f"Cassette latency {latency} is not supported.")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.entries: dict[str, list[dict]] = defaultdict(list)
+        self.served: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if mode == "replay":
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries[entry["key"]].append(entry)
+            logger.info(
+                f"Replaying {sum(map(len, self.entries.values()))} LLM calls from {path}"
+            )
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def get(self, model_name: str, params: dict, prompt: str) -> dict:
+        """
+        Get the next recorded call for a prompt.
+
+        Args:
+            `model_name` (`str`): The model name.
+            `params` (`dict`): The generation parameters.
+            `prompt` (`str`): The full prompt.
+
+        Returns:
+            `dict`: The recorded call.
+
+        Raises:
+            `CassetteMiss`: If the prompt was not recorded.
+        """
+        key = LLMCache.key(model_name, params, prompt)
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise CassetteMiss(
+                    f"No recorded call of {model_name} for prompt {prompt[:50]!r}..."
+                )
+            entry = entries[min(self.served[key], len(entries) - 1)]
+            self.served[key] += 1
+        return entry
+
+    def delay(self, entry: dict) -> float:
+        """
+        Get the time to wait before replaying a call.
+
+        Args:
+            `entry` (`dict`): The recorded call.
+
+        Returns:
+            `float`: The recorded latency, or `0` for `instant` replay.
+        """
+        return entry["latency"] if self.latency == "recorded" else 0.0
+
+    def chunks(self, entry: dict) -> list[tuple[float, str]]:
+        """
+        Get the chunks to replay a call as a stream.
+
+        Args:
+            `entry` (`dict`): The recorded call.
+
+        Returns:
+            `list[tuple[float, str]]`: The chunks with the time to wait before each, the whole response as one chunk for calls that were not streamed.
+        """
+        if "chunks" not in entry:
+            return [(self.delay(entry), entry["response"])]
+        chunks, last = [], 0.0
+        for offset, chunk in entry["chunks"]:
+            chunks.append((offset - last if self.latency == "recorded" else 0.0, chunk))
+            last = offset
+        return chunks
+
+    def record(
+        self,
+        model_name: str,
+        params: dict,
+        prompt: str,
+        response: str,
+        latency: float,
+        chunks: Optional[list[tuple[float, str]]] = None,
+    ) -> None:
+        """
+        Append a call to the cassette.
+
+        Args:
+            `model_name` (`str`): The model name.
+            `params` (`dict`): The generation parameters.
+            `prompt` (`str`): The full prompt.
+            `response` (`str`): The LLM response.
+            `latency` (`float`): The latency of the call in seconds.
+            `chunks` (`Optional[list[tuple[float, str]]]`): The chunks of a streamed call, with their offsets from the start of the call. Defaults to `None`.
+        """
+        entry = {
+            "key": LLMCache.key(model_name, params, prompt),
+            "model": model_name,
+            "params": params,
+            "prompt": prompt,
+            "response": response,
+            "latency": latency,
+        }
+        if chunks is not None:
+            entry["chunks"] = chunks
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_cassette: Optional[Cassette] = None
+
+
+def set_cassette(cassette: Optional[Cassette]) -> None:
+    """
+    Set the cassette shared by all LLMs of the process.
+
+    Args:
+        `cassette` (`Optional[Cassette]`): The cassette, or `None` to call the API.
+    """
+    global _cassette
+    _cassette = cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Get the cassette shared by all LLMs of the process.
+
+    Returns:
+        `Optional[Cassette]`: The cassette, or `None` if no cassette is set.
+    """
+    return _cassette
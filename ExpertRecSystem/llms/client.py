@@ -0,0 +1,180 @@
+import httpx
+import threading
+from typing import Any, Optional
+
+
+class ConnectionStats:
+    """
+    Counts the requests sent through the shared HTTP clients and the connections they opened, from the `httpcore` trace events. Every request that did not open a connection reused a pooled keep-alive connection.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def trace(self, event: str, info: dict) -> None:
+        """
+        Handle an `httpcore` trace event.
+
+        Args:
+            `event` (`str`): The event name, e.g. `connection.connect_tcp.complete`.
+            `info` (`dict`): The event information.
+        """
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def atrace(self, event: str, info: dict) -> None:
+        self.trace(event, info)
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """
+        Connection reuse statistics of the shared HTTP clients.
+
+        Returns:
+            `dict[str, int | float]`: The number of requests, opened connections and TLS handshakes, and the fraction of requests served on a reused connection.
+        """
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+            }
+
+
+class _TracedTransport(httpx.HTTPTransport):
+    def __init__(self, connection_stats: ConnectionStats, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.connection_stats = connection_stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.connection_stats.count_request()
+        request.extensions["trace"] = self.connection_stats.trace
+        return super().handle_request(request)
+
+
+class _AsyncTracedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, connection_stats: ConnectionStats, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.connection_stats = connection_stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.connection_stats.count_request()
+        request.extensions["trace"] = self.connection_stats.atrace
+        return await super().handle_async_request(request)
+
+
+class HTTPClientRegistry:
+    """
+    Process-wide HTTP clients shared by all LLM instances, so the agents reuse one keep-alive connection pool instead of each opening its own connections to the API.
+
+    Config:
+        `max_connections` (`int`): The maximum number of connections of each pool. Defaults to `20`.
+        `max_keepalive_connections` (`int`): The maximum number of idle keep-alive connections. Defaults to `10`.
+        `keepalive_expiry` (`float`): Seconds an idle connection is kept alive. Defaults to `60`.
+        `timeout` (`float`): The read, write and pool timeout in seconds. Defaults to `60`.
+        `connect_timeout` (`float`): The connect timeout in seconds. Defaults to `10`.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60,
+        timeout: float = 60,
+        connect_timeout: float = 10,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.connection_stats = ConnectionStats()
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """
+        The shared synchronous client, created on first use.
+
+        Returns:
+            `httpx.Client`: The client.
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    transport=_TracedTransport(
+                        self.connection_stats, limits=self.limits
+                    ),
+                    limits=self.limits,
+                    timeout=self.timeout,
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        The shared asynchronous client, created on first use. Its connections belong to the event loop that opened them, so use it from one event loop.
+
+        Returns:
+            `httpx.AsyncClient`: The client.
+        """
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(
+                    transport=_AsyncTracedTransport(
+                        self.connection_stats, limits=self.limits
+                    ),
+                    limits=self.limits,
+                    timeout=self.timeout,
+                )
+            return self._async_client
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """
+        Connection reuse statistics, see `ConnectionStats.stats`.
+
+        Returns:
+            `dict[str, int | float]`: The statistics.
+        """
+        return self.connection_stats.stats
+
+
+_http_clients: Optional[HTTPClientRegistry] = None
+
+
+def set_http_clients(registry: Optional[HTTPClientRegistry]) -> None:
+    """
+    Set the HTTP clients shared by all LLMs of the process.
+
+    Args:
+        `registry` (`Optional[HTTPClientRegistry]`): The registry, or `None` to let every LLM create its own client.
+    """
+    global _http_clients
+    _http_clients = registry
+
+
+def get_http_clients() -> Optional[HTTPClientRegistry]:
+    """
+    Get the HTTP clients shared by all LLMs of the process.
+
+    Returns:
+        `Optional[HTTPClientRegistry]`: The registry, or `None` if the clients are not shared.
+    """
+    return _http_clients
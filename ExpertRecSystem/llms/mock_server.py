@@ -0,0 +1,341 @@
+import re
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from loguru import logger
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXPERT_PATTERN = re.compile(r"^专家\d+:(\{.*\})$", re.MULTILINE)
+PACKED_EXPERT_PATTERN = re.compile(
+    r"^专家编号:(.*)\n姓名:(.*)\n专业:(.*)$", re.MULTILINE
+)
+
+
+def parse_experts(prompt: str) -> list[dict]:
+    """
+    Parse the expert entries of a Recommender or Explainer prompt, see `PromptBudget.format_entry`.
+
+    Args:
+        `prompt` (`str`): The prompt.
+
+    Returns:
+        `list[dict]`: The expert entries, in prompt order.
+    """
+    experts = []
+    for match in EXPERT_PATTERN.finditer(prompt):
+        try:
+            experts.append(json.loads(match.group(1)))
+        except json.JSONDecodeError:
+            continue
+    return experts
+
+
+def mock_analysis(name: str, specialty: str) -> str:
+    """
+    Get a canned ExpertAnalyst analysis of one expert.
+
+    Args:
+        `name` (`str`): The expert name.
+        `specialty` (`str`): The expert specialty.
+
+    Returns:
+        `str`: The analysis.
+    """
+    return (
+        f"**分析**:\n{name}的专业背景是{specialty}，评审过的项目与其专业高度相关。\n\n"
+        "**评审特点**:\n1. 注重技术指标。\n2. 关注设备的实用性。\n3. 重视预算的合理性。\n\n"
+        f"**推荐建议**:\n1. 推荐评审{specialty}相关项目。\n2. 推荐评审大型设备采购项目。\n3. 推荐评审跨学科项目。"
+    )
+
+
+def mock_response(prompt: str) -> str:
+    """
+    Get a canned response in the output format of the agent that wrote the prompt.
+
+    Args:
+        `prompt` (`str`): The prompt.
+
+    Returns:
+        `str`: The response. The Recommender gets `sorted_experts` JSON with the experts of its prompt, and a packed ExpertAnalyst prompt gets a JSON object of analyses keyed by expert ID.
+    """
+    if "sorted_experts" in prompt:
+        experts = parse_experts(prompt)
+        return json.dumps(
+            {
+                "sorted_experts": [
+                    {
+                        "rank": rank,
+                        "name": expert.get("expert_name", expert.get("name", "")),
+                        "specialist": expert.get("specialist", ""),
+                    }
+                    for rank, expert in enumerate(experts, start=1)
+                ]
+            },
+            ensure_ascii=False,
+        )
+    if "推荐解释器" in prompt:
+        return "**推荐解释**:\n" + "\n".join(
+            f"{i}. **专家{i}: {expert.get('name', '')}**: {expert.get('name', '')}的专业背景是{expert.get('specialist', '')}，评审过与当前项目相关的项目，适合评审该项目。"
+            for i, expert in enumerate(parse_experts(prompt), start=1)
+        )
+    if "评审专家”的分析师" in prompt and PACKED_EXPERT_PATTERN.search(prompt):
+        return json.dumps(
+            {
+                expert_id.strip(): mock_analysis(name.strip(), specialty.strip())
+                for expert_id, name, specialty in PACKED_EXPERT_PATTERN.findall(prompt)
+            },
+            ensure_ascii=False,
+        )
+    if "评审专家”的分析师" in prompt:
+        name = re.search(r"姓名:(.*)", prompt)
+        specialty = re.search(r"专业:(.*)", prompt)
+        return mock_analysis(
+            name.group(1).strip() if name else "该专家",
+            specialty.group(1).strip() if specialty else "",
+        )
+    if "项目”分析师" in prompt:
+        return (
+            "1. **项目特点**:\n**技术前沿性：** 项目涉及前沿的实验设备。\n"
+            "**多学科交叉：** 项目需要多个学科的知识。\n\n"
+            "2. **推荐专家**:\n推荐相关专业领域的专家。"
+        )
+    return "OK"
+
+
+class MockLLMServer:
+    """
+    A local stand-in for the OpenAI chat-completions API, for benchmarking the system without paying for API calls and with reproducible latencies. Responses are canned per agent, streaming is served as server-sent events, and latency, generation speed and errors are configurable.
+
+    Config:
+        `host` (`str`): The host to bind. Defaults to `127.0.0.1`.
+        `port` (`int`): The port to bind, `0` for a free port. Defaults to `0`.
+        `latency` (`dict`): The distribution of the time to the first token in seconds. `{"distribution": "constant", "value": v}`, `{"distribution": "uniform", "low": a, "high": b}` or `{"distribution": "lognormal", "median": m, "sigma": s}`. Defaults to a constant `0`.
+        `tokens_per_second` (`float`): The generation speed, one token per character. `0` returns the whole response at once. Defaults to `0`.
+        `error_rate` (`float`): The fraction of requests answered with an error. Defaults to `0`.
+        `error_status` (`int`): The HTTP status of injected errors. Defaults to `429`.
+        `seed` (`Optional[int]`): The seed of the latency and error sampling. Defaults to `None`.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Optional[dict] = None,
+        tokens_per_second: float = 0,
+        error_rate: float = 0,
+        error_status: int = 429,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency or {"distribution": "constant", "value": 0}
+        if self.latency["distribution"] not in ["constant", "uniform", "lognormal"]:
+            raise ValueError(
+                f"Latency distribution {self.latency['distribution']} is not supported."
+            )
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        The API base URL of the server.
+
+        Returns:
+            `str`: The URL, ending in `/v1`.
+        """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def sample_latency(self) -> float:
+        with self._lock:
+            if self.latency["distribution"] == "constant":
+                return self.latency["value"]
+            if self.latency["distribution"] == "uniform":
+                return self.random.uniform(self.latency["low"], self.latency["high"])
+            return self.random.lognormvariate(
+                math.log(self.latency["median"]), self.latency["sigma"]
+            )
+
+    def sample_error(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            error = self.random.random() < self.error_rate
+            self.errors += error
+            return error
+
+    def start(self) -> str:
+        """
+        Serve in a daemon thread.
+
+        Returns:
+            `str`: The API base URL of the server.
+        """
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="mock-llm", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Mock LLM server listening on {self.url}")
+        return self.url
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the socket.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+            def log_message(self, format: str, *args) -> None:
+                logger.trace(format % args)
+
+            def send_json(self, status: int, body: dict, headers: dict = {}) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_chunk(self, data: str) -> None:
+                data = data.encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path not in ["/v1/chat/completions", "/v1/completions"]:
+                    self.send_json(404, {"error": {"message": f"No route {self.path}"}})
+                    return
+                request = json.loads(body)
+                if server.sample_error():
+                    self.send_json(
+                        server.error_status,
+                        {
+                            "error": {
+                                "message": "Injected error",
+                                "type": "mock_error",
+                                "code": server.error_status,
+                            }
+                        },
+                        {"Retry-After": "1"} if server.error_status == 429 else {},
+                    )
+                    return
+                chat = self.path == "/v1/chat/completions"
+                prompt = (
+                    request["messages"][-1]["content"] if chat else request["prompt"]
+                )
+                if isinstance(prompt, list):
+                    prompt = prompt[0]
+                content = mock_response(prompt)
+                time.sleep(server.sample_latency())
+                completion_id = f"mock-{uuid.uuid4().hex}"
+                model = request.get("model", "mock")
+                if request.get("stream"):
+                    self.stream(completion_id, model, content, chat)
+                    return
+                if server.tokens_per_second:
+                    time.sleep(len(content) / server.tokens_per_second)
+                choice = {"index": 0, "finish_reason": "stop", "logprobs": None}
+                if chat:
+                    choice["message"] = {"role": "assistant", "content": content}
+                else:
+                    choice["text"] = content
+                self.send_json(
+                    200,
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion" if chat else "text_completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [choice],
+                        "usage": {
+                            "prompt_tokens": len(prompt),
+                            "completion_tokens": len(content),
+                            "total_tokens": len(prompt) + len(content),
+                        },
+                    },
+                )
+
+            def stream(
+                self, completion_id: str, model: str, content: str, chat: bool
+            ) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                step = 4
+                pieces = [content[i : i + step] for i in range(0, len(content), step)]
+                for i, piece in enumerate(pieces + [None]):
+                    if chat:
+                        delta = {} if piece is None else {"content": piece}
+                        if i == 0:
+                            delta["role"] = "assistant"
+                        choice = {"index": 0, "delta": delta}
+                    else:
+                        choice = {"index": 0, "text": piece or ""}
+                    choice["finish_reason"] = "stop" if piece is None else None
+                    event = {
+                        "id": completion_id,
+                        "object": (
+                            "chat.completion.chunk" if chat else "text_completion"
+                        ),
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [choice],
+                    }
+                    self.send_chunk(
+                        f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    )
+                    if piece is not None and server.tokens_per_second:
+                        time.sleep(len(piece) / server.tokens_per_second)
+                self.send_chunk("data: [DONE]\n\n")
+                self.send_chunk("")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--latency",
+        type=str,
+        default='{"distribution": "lognormal", "median": 0.8, "sigma": 0.5}',
+        help="The latency distribution as JSON",
+    )
+    parser.add_argument("--tokens_per_second", type=float, default=50)
+    parser.add_argument("--error_rate", type=float, default=0)
+    parser.add_argument("--error_status", type=int, default=429)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    server = MockLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=json.loads(args.latency),
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    logger.info(f"Mock LLM server listening on {server.url}")
+    server.server.serve_forever()
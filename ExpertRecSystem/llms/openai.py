@@ -1,6 +1,11 @@
+import tiktoken
+from loguru import logger
+from typing import Any, Iterator
 from langchain_openai import ChatOpenAI, OpenAI
 from langchain.schema import HumanMessage
 from ExpertRecSystem.llms.basellm import BaseLLM
+from ExpertRecSystem.llms.client import get_http_clients
+from ExpertRecSystem.llms.ratelimit import get_rate_limiter
 
 
 class AnyOpenAILLM(BaseLLM):
@@ -9,7 +14,7 @@ class AnyOpenAILLM(BaseLLM):
         model_name: str = "gpt-3.5-turbo",
         json_mode: bool = False,
         *args,
-        **kwargs
+        **kwargs,
     ):
         """Initialize the OpenAI LLM.
 
@@ -24,9 +29,27 @@ class AnyOpenAILLM(BaseLLM):
                 "json_mode is only available for gpt-3.5-turbo, gpt-4-1106-preview"
             )
         self.max_tokens: int = kwargs.get("max_tokens", 256)
+        self.params = {
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": self.max_tokens,
+            "json_mode": json_mode,
+        }
+        # gpt-3.5-turbo-1106 and -0125 have a 16k context without "16k" in the name,
+        # and the prompt budgets are capped by the context length
         self.max_context_length: int = (
-            16384 if "16k" in model_name else 32768 if "32k" in model_name else 4096
+            16384
+            if "16k" in model_name or model_name.endswith(("-1106", "-0125"))
+            else 32768 if "32k" in model_name else 4096
         )
+        self._encoding = None
+        http_clients = get_http_clients()
+        if http_clients is not None and "http_client" not in kwargs:
+            # Share one connection pool between all agents
+            kwargs["http_client"] = http_clients.client
+            kwargs["http_async_client"] = http_clients.async_client
+        if get_rate_limiter() is not None:
+            # The rate limiter retries, the client must not retry on its own
+            kwargs.setdefault("max_retries", 0)
         if model_name.split("-")[0] == "text" or model_name == "gpt-3.5-turbo-instruct":
             self.model = OpenAI(model_name=model_name, *args, **kwargs)
             self.model_type = "completion"
@@ -34,21 +57,73 @@ class AnyOpenAILLM(BaseLLM):
             self.model = ChatOpenAI(model_name=model_name, *args, **kwargs)
             self.model_type = "chat"
 
-    def __call__(self, prompt: str, *args, **kwargs) -> str:
-        """Forward pass of the OpenAI LLM.
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text with the tokenizer of the model. Falls back to `BaseLLM.count_tokens` if the tokenizer cannot be loaded, e.g. offline.
 
         Args:
-            `prompt` (`str`): The prompt to feed into the LLM.
+            `text` (`str`): The text.
         Returns:
-            `str`: The OpenAI LLM output.
+            `int`: The number of tokens.
         """
+        if self._encoding is None:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model_name)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(
+                    f"Failed to load the tokenizer of {self.model_name}: {e}"
+                )
+                self._encoding = False
+        if self._encoding is False:
+            return super().count_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def _build_input(self, prompt: str) -> str | list[HumanMessage]:
         if self.model_type == "completion":
-            return self.model.invoke(prompt).content.strip()
+            return prompt
         else:
-            return self.model.invoke(
-                [
-                    HumanMessage(
-                        content=prompt,
-                    )
-                ]
-            ).content.strip()
+            return [
+                HumanMessage(
+                    content=prompt,
+                )
+            ]
+
+    def _parse_output(self, response: Any) -> str:
+        # Completion models return a string, chat models a message
+        if isinstance(response, str):
+            return response.strip()
+        return response.content.strip()
+
+    def _call(self, prompt: str, *args, **kwargs) -> str:
+        """Call the OpenAI LLM.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Returns:
+            `str`: The OpenAI LLM output.
+        """
+        return self._parse_output(self.model.invoke(self._build_input(prompt)))
+
+    async def _acall(self, prompt: str, *args, **kwargs) -> str:
+        """Call the OpenAI LLM with the async OpenAI client, so many calls can be in flight in one event loop.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Returns:
+            `str`: The OpenAI LLM output.
+        """
+        return self._parse_output(await self.model.ainvoke(self._build_input(prompt)))
+
+    def _stream(self, prompt: str, *args, **kwargs) -> Iterator[str]:
+        """Stream the OpenAI LLM output token by token.
+
+        Args:
+            `prompt` (`str`): The prompt to feed into the LLM.
+        Yields:
+            `str`: The chunks of the OpenAI LLM output.
+        """
+        for chunk in self.model.stream(self._build_input(prompt)):
+            # Completion models stream strings, chat models message chunks
+            yield chunk if isinstance(chunk, str) else chunk.content
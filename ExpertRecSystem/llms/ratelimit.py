@@ -0,0 +1,343 @@
+import time
+import random
+import asyncio
+import threading
+import httpx
+import openai
+from loguru import logger
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at `rate_per_minute`, holding at most one minute of tokens.
+    """
+
+    def __init__(self, rate_per_minute: float) -> None:
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Get the time until `amount` tokens are available. Requests larger than the capacity only wait for a full bucket.
+
+        Args:
+            `amount` (`float`): The number of tokens.
+
+        Returns:
+            `float`: The time to wait in seconds, `0` if the tokens are available now.
+        """
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether an LLM API error is transient: rate limits (429), server errors (5xx), timeouts and dropped connections.
+
+    Args:
+        `error` (`Exception`): The error.
+
+    Returns:
+        `bool`: Whether the call should be retried.
+    """
+    if isinstance(
+        error,
+        (
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            httpx.TimeoutException,
+            httpx.NetworkError,
+        ),
+    ):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    A client-side rate limiter shared by all LLMs of the process. Calls wait for a concurrency slot and for the request and token buckets of the provider limits, and transient errors are retried with jittered exponential backoff.
+
+    The concurrency limit adapts to the provider (AIMD): it is halved on every rate limit or timeout, and grows by one slot per `limit` fast successful calls. A call slower than `latency_threshold` also halves it, at most once per `latency_threshold` seconds, since the slow calls of one congestion episode complete together.
+
+    Config:
+        `requests_per_minute` (`float`): The request limit of the provider. Defaults to `3500`.
+        `tokens_per_minute` (`float`): The token limit of the provider, counting the prompt and `max_tokens`. Defaults to `90000`.
+        `max_concurrency` (`int`): The maximum number of calls in flight. Defaults to `16`.
+        `min_concurrency` (`int`): The minimum concurrency limit. Defaults to `1`.
+        `latency_threshold` (`float`): Seconds above which a successful call counts as congested. Defaults to `30`.
+        `max_retries` (`int`): The maximum number of retries of a call. Defaults to `6`.
+        `base_delay` (`float`): The backoff delay of the first retry in seconds. Defaults to `1`.
+        `max_delay` (`float`): The maximum backoff delay in seconds. Defaults to `60`.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 3500,
+        tokens_per_minute: float = 90000,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        latency_threshold: float = 30,
+        max_retries: int = 6,
+        base_delay: float = 1,
+        max_delay: float = 60,
+    ) -> None:
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.latency_threshold = latency_threshold
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self._last_slowdown = -float("inf")
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        # Take a slot and the budget at once, or return how long to wait
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return 0.05
+            wait = max(
+                self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens)
+            )
+            if wait > 0:
+                return wait
+            self.request_bucket.take(1)
+            self.token_bucket.take(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def release(self) -> None:
+        """
+        Release the concurrency slot taken by `acquire`.
+        """
+        with self._lock:
+            self.in_flight -= 1
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self.waited += waited
+
+    def _on_success(self, latency: float) -> None:
+        with self._lock:
+            self.calls += 1
+            if latency < self.latency_threshold:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                return
+            now = time.monotonic()
+            if now - self._last_slowdown >= self.latency_threshold:
+                self._last_slowdown = now
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                logger.warning(
+                    f"LLM call took {latency:.1f}s, concurrency limit {int(self.limit)}"
+                )
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        """
+        Record a failed attempt and get the backoff delay before the next one.
+
+        Args:
+            `error` (`Exception`): The error of the attempt.
+            `attempt` (`int`): The 0-based number of the attempt.
+
+        Returns:
+            `float`: The delay in seconds.
+
+        Raises:
+            `Exception`: The error itself if it is not retryable or the retries are used up.
+        """
+        if not is_retryable(error) or attempt >= self.max_retries:
+            with self._lock:
+                self.failures += 1
+            raise error
+        with self._lock:
+            self.retries += 1
+            self.limit = max(self.min_concurrency, self.limit / 2)
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        delay = random.uniform(delay / 2, delay)  # Jitter spreads out the retries
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        logger.warning(
+            f"LLM call failed ({type(error).__name__}: {error}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s, concurrency limit {int(self.limit)}"
+        )
+        return delay
+
+    def acquire(self, tokens: int) -> None:
+        """
+        Wait for a concurrency slot and the rate budget of a call. Release the slot with `release`.
+
+        Args:
+            `tokens` (`int`): The estimated tokens of the call.
+        """
+        start = time.monotonic()
+        while (wait := self._reserve(tokens)) > 0:
+            time.sleep(wait)
+        self._record_wait(time.monotonic() - start)
+
+    async def aacquire(self, tokens: int) -> None:
+        """
+        Asynchronous version of `acquire`.
+
+        Args:
+            `tokens` (`int`): The estimated tokens of the call.
+        """
+        start = time.monotonic()
+        while (wait := self._reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+        self._record_wait(time.monotonic() - start)
+
+    def call(self, func: Callable[..., Any], tokens: int, *args, **kwargs) -> Any:
+        """
+        Call `func` within the limits, retrying transient errors.
+
+        Args:
+            `func` (`Callable[..., Any]`): The LLM call.
+            `tokens` (`int`): The estimated tokens of the call.
+
+        Returns:
+            `Any`: The result of `func`.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            start = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.release()
+                time.sleep(self._on_error(e, attempt))
+                continue
+            self.release()
+            self._on_success(time.monotonic() - start)
+            return result
+
+    async def acall(
+        self, func: Callable[..., Awaitable[Any]], tokens: int, *args, **kwargs
+    ) -> Any:
+        """
+        Asynchronous version of `call`.
+
+        Args:
+            `func` (`Callable[..., Awaitable[Any]]`): The asynchronous LLM call.
+            `tokens` (`int`): The estimated tokens of the call.
+
+        Returns:
+            `Any`: The result of `func`.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(tokens)
+            start = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                self.release()
+                await asyncio.sleep(self._on_error(e, attempt))
+                continue
+            self.release()
+            self._on_success(time.monotonic() - start)
+            return result
+
+    def stream(
+        self, func: Callable[..., Iterator[str]], tokens: int, *args, **kwargs
+    ) -> Iterator[str]:
+        """
+        Streaming version of `call`. Only errors before the first chunk are retried, as the chunks already yielded cannot be taken back.
+
+        Args:
+            `func` (`Callable[..., Iterator[str]]`): The streaming LLM call.
+            `tokens` (`int`): The estimated tokens of the call.
+
+        Yields:
+            `str`: The chunks of the LLM output.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in func(*args, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.release()
+                if started:
+                    raise
+                time.sleep(self._on_error(e, attempt))
+                continue
+            except GeneratorExit:
+                self.release()
+                raise
+            self.release()
+            self._on_success(time.monotonic() - start)
+            return
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """
+        Counters of the limiter.
+
+        Returns:
+            `dict[str, int | float]`: The successful calls, retries and failures, the current concurrency limit and the total time spent waiting for the limits.
+        """
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "concurrency_limit": int(self.limit),
+            "waited": round(self.waited, 2),
+        }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """
+    Set the rate limiter shared by all LLMs of the process.
+
+    Args:
+        `limiter` (`Optional[RateLimiter]`): The limiter, or `None` to disable rate limiting.
+    """
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Get the rate limiter shared by all LLMs of the process.
+
+    Returns:
+        `Optional[RateLimiter]`: The limiter, or `None` if rate limiting is disabled.
+    """
+    return _rate_limiter
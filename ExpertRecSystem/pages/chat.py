@@ -1,4 +1,5 @@
 import os
+import pandas as pd
 import streamlit as st
 import time
 from loguru import logger
@@ -149,6 +150,7 @@ def chat_config(
         st.session_state.chat_history = []
     assert isinstance(st.session_state.chat_history, list)
     chat_page(system=system, top_k=top_k, num=num)
+    batch_recall_page(system=system, top_k=top_k)
 
 
 def chat_page(system: CollaborationSystem, top_k: int, num: int) -> None:
@@ -192,6 +194,15 @@ def chat_page(system: CollaborationSystem, top_k: int, num: int) -> None:
             label_visibility="hidden",
             placeholder="请输入项目简介",
         )
+        specialists = st.multiselect(
+            "限定专业", system.expert_store.specialist_values, placeholder="不限专业"
+        )
+        exclude_workplaces = st.text_input(
+            "回避单位",
+            value="",
+            placeholder="回避单位 (如采购单位, 多个单位用逗号分隔)",
+        )
+        stream = st.toggle("流式输出", value=system.stream)
         submit_button = st.form_submit_button("提交")
 
     if submit_button:
@@ -202,19 +213,71 @@ def chat_page(system: CollaborationSystem, top_k: int, num: int) -> None:
             prompt = [project_name, project_description]
             add_chat_message("user", f"项目名称: {prompt[0]}  \n项目简介: {prompt[1]}")
 
+            # The run log stays ahead of the ranking in the chat history
+            run_log = {"role": "assistant", "message": ["#### 系统正在运行..."]}
+            st.session_state.chat_history.append(run_log)
             with st.chat_message("assistant"):
                 st.markdown("#### 系统正在运行...")
-                response = system(user_input=prompt, top_k=top_k, num=num)
-                st.session_state.chat_history.append(
-                    {
-                        "role": "assistant",
-                        "message": ["#### 系统正在运行..."] + system.web_log,
-                    }
+                filters = {
+                    "specialist": specialists,
+                    "exclude_workplace": [
+                        workplace.strip()
+                        for workplace in exclude_workplaces.replace("，", ",").split(
+                            ","
+                        )
+                        if workplace.strip()
+                    ],
+                }
+                system.stream = stream
+                # Show the ranking as soon as it is ready, the explanation follows
+                stages = system.forward_progressive(
+                    user_input=prompt, top_k=top_k, num=num, filters=filters
                 )
+                response = next(stages)
             add_chat_message("assistant", response)
+            with st.chat_message("assistant"):
+                for _ in stages:
+                    pass
+            run_log["message"] += system.web_log
             st.session_state.project_name = ""
             st.session_state.project_description = ""
             time.sleep(8)
             st.rerun()
         else:
             st.warning("请填写完整的项目名称和简介！")
+
+
+def batch_recall_page(system: CollaborationSystem, top_k: int) -> None:
+    """
+    Render the batch recall section, which recalls experts for every project of an uploaded CSV file with one call to `recall_batch`.
+
+    Args:
+        `system` (`CollaborationSystem`): The system used to recall the experts.
+        `top_k` (`int`): The number of top experts to recall per project.
+    """
+    with st.expander("批量召回"):
+        uploaded_file = st.file_uploader(
+            "上传项目列表 (CSV, 包含 project_name 和 project_infos 列)", type="csv"
+        )
+        if uploaded_file is None:
+            return
+        projects = pd.read_csv(uploaded_file, encoding="utf-8")
+        if not {"project_name", "project_infos"}.issubset(projects.columns):
+            st.warning("CSV 文件需要包含 project_name 和 project_infos 列！")
+            return
+        if not st.button("开始召回"):
+            return
+        user_inputs = projects[["project_name", "project_infos"]].values.tolist()
+        with st.spinner(f"正在为 {len(user_inputs)} 个项目召回专家..."):
+            expert_info_lists = system.recall_batch(user_inputs, top_k=top_k)
+        projects["experts"] = [
+            "、".join(expert["expert_name"] for expert in experts)
+            for experts in expert_info_lists
+        ]
+        st.dataframe(projects[["project_name", "experts"]], use_container_width=True)
+        st.download_button(
+            "下载召回结果",
+            projects.to_csv(index=False).encode("utf-8-sig"),
+            file_name="recall_results.csv",
+            mime="text/csv",
+        )
@@ -1,7 +1,7 @@
 import streamlit as st
 from loguru import logger
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 from ExpertRecSystem.agents import Agent
 from ExpertRecSystem.utils import read_json, get_avatar, get_color, get_name
 
@@ -56,10 +56,24 @@ class System(ABC):
         """
         raise NotImplementedError("System.forward() not implemented")
 
+    async def aforward(self, *args, **kwargs) -> Any:
+        """Asynchronous forward pass of the system.
+
+        Raises:
+            `NotImplementedError`: Should be implemented in subclasses that serve concurrent requests.
+        Returns:
+            `Any`: The system output.
+        """
+        raise NotImplementedError("System.aforward() not implemented")
+
     def __call__(self, *args: Any, **kwargs: Any) -> Any:
         self.clear_web_log()
         return self.forward(*args, **kwargs)
 
+    async def acall(self, *args: Any, **kwargs: Any) -> Any:
+        self.clear_web_log()
+        return await self.aforward(*args, **kwargs)
+
     def clear_web_log(self) -> None:
         self.web_log = []
 
@@ -123,3 +137,34 @@ class System(ABC):
                     for item_mesagge in message:
                         self.web_log.append(item_mesagge)
                         st.markdown(item_mesagge)
+
+    def log_stream(
+        self,
+        chunks: Iterator[str],
+        agent: Optional[Agent] = None,
+        type: str = None,
+    ) -> str:
+        """Log a streamed message. In the web demo the chunks are written to the page as they arrive.
+
+        Args:
+            `chunks` (`Iterator[str]`): The chunks of the message.
+            `agent` (`Agent`, optional): The agent to log the message. Defaults to `None`.
+            `type` (`str`, optional): The role to log the message as if `agent` is `None`. Defaults to `None`.
+        Returns:
+            `str`: The whole message.
+        """
+        if self.web_demo:
+            if agent is None:
+                role = type
+            else:
+                role = agent.__class__.__name__
+            header_message = (
+                f"{get_avatar(role)}:{get_color(role)}[**{get_name(role)}**]"
+            )
+            st.markdown(header_message)
+            message = st.write_stream(chunks).strip()
+            self.web_log.append(f"{header_message}  \n\n{message}")
+        else:
+            message = "".join(chunks).strip()
+        logger.debug(message)
+        return message
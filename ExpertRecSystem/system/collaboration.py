@@ -1,9 +1,17 @@
+import copy
 import json
+import time
+import asyncio
+import faiss
+import numpy as np
 import streamlit as st
-from typing import Any, Optional
+from typing import Any, Generator, Optional
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 from ExpertRecSystem.system.base import System
-from transformers import AutoTokenizer, AutoModel
+from ExpertRecSystem.llms.cache import get_llm_cache
+from ExpertRecSystem.llms.client import get_http_clients
+from ExpertRecSystem.llms.ratelimit import get_rate_limiter
 from ExpertRecSystem.agents import (
     Agent,
     ProjectAnalyst,
@@ -12,11 +20,17 @@ from ExpertRecSystem.agents import (
     Recommender,
 )
 from ExpertRecSystem.utils import (
+    ExpertFilter,
     format_chat_history,
+    get_embedding_cache,
     get_project_embedding,
+    get_project_embeddings,
+    load_embedding_model,
     load_faiss_index,
     find_similar_experts,
-    read_expert_data,
+    get_search_params,
+    is_id_mapped,
+    read_expert_store,
     read_json,
 )
 
@@ -43,14 +57,34 @@ class CollaborationSystem(System):
         self.device = kwargs["device"]
         self.init_agents(self.config["agents"])
         self.recall_config = read_json(self.config["recall_config"])
-        self.index = load_faiss_index(self.recall_config["index_path"])
-        self.expert_data = read_expert_data(self.recall_config["description_path"])
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.recall_config["emb_model_path"]
+        self.index_config = self.recall_config.get("index", {})
+        self.index = load_faiss_index(
+            self.recall_config["index_path"], self.index_config
         )
-        self.model = AutoModel.from_pretrained(self.recall_config["emb_model_path"]).to(
-            self.device
+        self.search_params = get_search_params(self.index_config)
+        self.expert_store = read_expert_store(
+            self.recall_config["description_path"], self.recall_config.get("data_path")
         )
+        memory = self.expert_store.memory_usage()
+        logger.info(
+            f"Expert store: {len(self.expert_store)} experts, "
+            f"{memory['total'] / 2**20:.1f} MB (DataFrame: {memory['pandas'] / 2**20:.1f} MB)"
+        )
+        self.expert_filter = ExpertFilter(self.expert_store, is_id_mapped(self.index))
+        self.tokenizer, self.model = load_embedding_model(
+            self.recall_config, self.device
+        )
+        self.embedding_cache = get_embedding_cache(self.recall_config)
+        # Recall does not depend on the ProjectAnalyst, so both can run at once
+        self.concurrent_stages = self.config.get("concurrent_stages", True)
+        # Push the ProjectAnalyst and Explainer output to the page token by token
+        self.stream = self.web_demo and self.config.get("stream", False)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recall")
+        self.background_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="explainer"
+        )
+        self.explanation = None
+        self.timings: dict[str, float] = {}
 
     def init_agents(self, agents: dict[str, dict]) -> None:
         """
@@ -121,6 +155,21 @@ class CollaborationSystem(System):
             return None
         return self.agents["Explainer"]
 
+    def fork(self) -> "CollaborationSystem":
+        """
+        Get a copy of the system for another worker thread. The copy shares the agents, the index, the expert store and the embedding model, but has its own chat history, timings, explanation and recall thread, so concurrent requests on different copies do not race. The agents still log to the original system, so copies are for batch callers without the web demo.
+
+        Returns:
+            `CollaborationSystem`: The copy.
+        """
+        assert not self.web_demo, "Forked systems do not support the web demo."
+        system = copy.copy(self)
+        system.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recall")
+        system.explanation = None
+        system.timings = {}
+        system.reset(clear=True)
+        return system
+
     def reset(self, clear: bool = False, *args, **kwargs) -> None:
         """
         Reset the system state, optionally clearing the chat history.
@@ -154,52 +203,282 @@ class CollaborationSystem(System):
         """
         return format_chat_history(self._chat_history)
 
-    def project_description(self, user_input: list[str]) -> Any:
+    def project_description(self, user_input: list[str], stream: bool = False) -> Any:
         """
         Use the ProjectAnalyst agent to analyze the project description provided by the user.
 
         Args:
             `user_input` (`list[str]`): A list containing the project name and project description.
+            `stream` (`bool`, optional): Whether to stream the analysis. Defaults to `False`.
 
         Returns:
-            `Any`: The result from the ProjectAnalyst agent.
+            `Any`: The result from the ProjectAnalyst agent, or an iterator over its chunks if `stream` is `True`.
         """
         project_name = user_input[0]
         project_infos = user_input[1]
         return self.project_analyst(
-            project_name=project_name, project_infos=project_infos
+            project_name=project_name, project_infos=project_infos, stream=stream
         )
 
-    def recall(self, user_input: list[str], top_k: int) -> list[dict]:
+    def analyze_project(self, user_input: list[str]) -> Any:
+        """
+        Analyze the project with the ProjectAnalyst and log the analysis. With `stream` the analysis is written to the page token by token.
+
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+
+        Returns:
+            `Any`: The result from the ProjectAnalyst agent.
+        """
+        if self.stream:
+            return self.log_stream(
+                self.project_description(user_input, stream=True), self.project_analyst
+            )
+        project = self.project_description(user_input)
+        self.log(project, self.project_analyst)
+        return project
+
+    def get_search_params(
+        self, filters: Optional[dict] = None
+    ) -> Optional[faiss.SearchParameters]:
+        """
+        Get the search parameters of the index, restricted to the experts allowed by the filters.
+
+        Args:
+            `filters` (`Optional[dict]`): The recall filters, see `ExpertFilter`. Defaults to `None`.
+
+        Returns:
+            `Optional[faiss.SearchParameters]`: The search parameters.
+        """
+        sel = self.expert_filter.selector(filters)
+        if sel is None:
+            return self.search_params
+        return get_search_params(self.index_config, sel=sel)
+
+    def recall(
+        self,
+        user_input: list[str],
+        top_k: int,
+        filters: Optional[dict] = None,
+        log: bool = True,
+    ) -> list[dict]:
         """
         Recall similar experts based on the project description.
 
         Args:
             `user_input` (`list[str]`): A list containing the project name and project description.
             `top_k` (`int`): The number of top similar experts to recall.
+            `filters` (`Optional[dict]`): The recall filters on `specialist`, `exclude_workplace` and `exclude_expert_id`, applied inside the index search. See `ExpertFilter`. Defaults to `None`.
+            `log` (`bool`, optional): Whether to log the recalled experts. Recall in a worker thread leaves it to the caller, see `log_recall`. Defaults to `True`.
 
         Returns:
             `list[dict]`: A list of dictionaries containing expert information, including similarity scores.
         """
         user_input = user_input[0] + ":" + user_input[1]
-        emb = get_project_embedding(user_input, self.tokenizer, self.model, self.device)
-        sim, indices = find_similar_experts(emb, self.index, top_k=top_k)
-        expert_ids = self.expert_data.iloc[indices[0]]["expert_id"].values
-        expert_names = self.expert_data.iloc[indices[0]]["expert_name"].values
-        specialist = self.expert_data.iloc[indices[0]]["specialist"].values
-        description = self.expert_data.iloc[indices[0]]["description"].values
-        expert_info_list = []
-        for i in range(len(expert_ids)):
-            expert_info = {
-                "expert_id": expert_ids[i],
-                "expert_name": expert_names[i],
-                "specialist": specialist[i],
-                "description": description[i],
-                "similarity": sim[i],
-            }
-            expert_info_list.append(expert_info)
+        emb = get_project_embedding(
+            user_input,
+            self.tokenizer,
+            self.model,
+            self.device,
+            cache=self.embedding_cache,
+        )
+        if self.embedding_cache is not None:
+            logger.debug(f"Embedding cache: {self.embedding_cache.stats}")
+        sim, indices = find_similar_experts(
+            emb, self.index, top_k=top_k, params=self.get_search_params(filters)
+        )
+        expert_info_list = self.lookup_experts(sim, indices[0])
+        if log:
+            self.log_recall(expert_info_list)
+        return expert_info_list
+
+    def log_recall(self, expert_info_list: list[dict]) -> None:
+        """
+        Log the recalled experts. Web logging must happen in the thread running the page.
+
+        Args:
+            `expert_info_list` (`list[dict]`): The recalled experts.
+        """
+        expert_names = [expert_info["expert_name"] for expert_info in expert_info_list]
         self.log("、".join(expert_names), type="Searcher")
         self.log(expert_info_list, type="ExpertAnalyst")
+
+    def analyze_and_recall(
+        self, user_input: list[str], top_k: int, filters: Optional[dict] = None
+    ) -> tuple[Any, list[dict]]:
+        """
+        Run the ProjectAnalyst and the recall. With `concurrent_stages` the recall runs in a worker thread while the ProjectAnalyst waits on the LLM API, hiding the embedding cost behind the network wait. Stage timings are recorded in `timings`.
+
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+            `top_k` (`int`): The number of top similar experts to recall.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+
+        Returns:
+            `tuple[Any, list[dict]]`: The project analysis and the recalled experts.
+        """
+        start = time.perf_counter()
+        if self.concurrent_stages:
+            recall_future = self.executor.submit(
+                self._timed, "recall", self.recall, user_input, top_k, filters, False
+            )
+            project = self._timed("project_analyst", self.analyze_project, user_input)
+            experts = recall_future.result()
+        else:
+            project = self._timed("project_analyst", self.analyze_project, user_input)
+            experts = self._timed(
+                "recall", self.recall, user_input, top_k, filters, False
+            )
+        self.timings["analyze_and_recall"] = time.perf_counter() - start
+        self.log_recall(experts)
+        return project, experts
+
+    async def aanalyze_and_recall(
+        self, user_input: list[str], top_k: int, filters: Optional[dict] = None
+    ) -> tuple[Any, list[dict]]:
+        """
+        Asynchronous version of `analyze_and_recall`. The recall runs in a worker thread while the ProjectAnalyst awaits the LLM API.
+
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+            `top_k` (`int`): The number of top similar experts to recall.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+
+        Returns:
+            `tuple[Any, list[dict]]`: The project analysis and the recalled experts.
+        """
+        start = time.perf_counter()
+        project_name, project_infos = user_input
+        stages = [
+            self._atimed(
+                "project_analyst",
+                self.project_analyst.acall(
+                    project_name=project_name, project_infos=project_infos
+                ),
+            ),
+            self._atimed(
+                "recall",
+                asyncio.to_thread(self.recall, user_input, top_k, filters, False),
+            ),
+        ]
+        if self.concurrent_stages:
+            project, experts = await asyncio.gather(*stages)
+        else:
+            project, experts = [await stage for stage in stages]
+        self.timings["analyze_and_recall"] = time.perf_counter() - start
+        self.log(project, self.project_analyst)
+        self.log_recall(experts)
+        return project, experts
+
+    def _timed(self, stage: str, func, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.timings[stage] = time.perf_counter() - start
+        return result
+
+    async def _atimed(self, stage: str, coroutine) -> Any:
+        start = time.perf_counter()
+        result = await coroutine
+        self.timings[stage] = time.perf_counter() - start
+        return result
+
+    def log_timings(self) -> None:
+        """
+        Log the stage timings of the last forward pass and the latency saved by running stages concurrently.
+        """
+        # Snapshot, batch runners update the timings from several threads
+        timings = dict(self.timings)
+        saved = (
+            timings.get("project_analyst", 0)
+            + timings.get("recall", 0)
+            - timings.get("analyze_and_recall", 0)
+        )
+        timings = ", ".join(f"{stage}: {t:.2f}s" for stage, t in timings.items())
+        logger.debug(f"Stage timings: {timings} (saved by concurrency: {saved:.2f}s)")
+
+    def recall_batch(
+        self,
+        user_inputs: list[list[str]],
+        top_k: int,
+        batch_size: int = 32,
+        filters: Optional[dict | list[Optional[dict]]] = None,
+    ) -> list[list[dict]]:
+        """
+        Recall similar experts for many projects at once. The projects are embedded in batched forward passes and searched with a single multi-query FAISS search. Nothing is logged to the web page.
+
+        Args:
+            `user_inputs` (`list[list[str]]`): The projects, each a list containing the project name and project description.
+            `top_k` (`int`): The number of top similar experts to recall per project.
+            `batch_size` (`int`, optional): The number of projects per forward pass. Defaults to 32.
+            `filters` (`Optional[dict | list[Optional[dict]]]`): The recall filters, shared by all projects or one per project. Projects with the same filters are searched together. See `ExpertFilter`. Defaults to `None`.
+
+        Returns:
+            `list[list[dict]]`: One list of expert information dictionaries per project, in the input order.
+        """
+        if len(user_inputs) == 0:
+            return []
+        project_descriptions = [
+            user_input[0] + ":" + user_input[1] for user_input in user_inputs
+        ]
+        embs = get_project_embeddings(
+            project_descriptions,
+            self.tokenizer,
+            self.model,
+            self.device,
+            batch_size=batch_size,
+            cache=self.embedding_cache,
+        )
+        if self.embedding_cache is not None:
+            logger.debug(f"Embedding cache: {self.embedding_cache.stats}")
+        if not isinstance(filters, list):
+            filters = [filters] * len(user_inputs)
+        groups: dict[str, list[int]] = {}
+        for i, project_filters in enumerate(filters):
+            key = json.dumps(project_filters, sort_keys=True, ensure_ascii=False)
+            groups.setdefault(key, []).append(i)
+        sims = np.zeros((len(user_inputs), top_k), dtype=np.float32)
+        indices = np.full((len(user_inputs), top_k), -1, dtype=np.int64)
+        for group in groups.values():
+            sims[group], indices[group] = self.index.search(
+                embs[group], top_k, params=self.get_search_params(filters[group[0]])
+            )
+        expert_info_lists = [
+            self.lookup_experts(sim, labels) for sim, labels in zip(sims, indices)
+        ]
+        logger.debug(
+            f"Recalled experts for {len(expert_info_lists)} projects: "
+            f"{[len(expert_info_list) for expert_info_list in expert_info_lists]}"
+        )
+        return expert_info_lists
+
+    def lookup_experts(self, sim: np.ndarray, labels: np.ndarray) -> list[dict]:
+        """
+        Turn the result row of a FAISS search into expert information dictionaries.
+
+        Args:
+            `sim` (`np.ndarray`): The cosine similarities of one query.
+            `labels` (`np.ndarray`): The labels of one query, positions or expert IDs depending on the index. Missing results are `-1`.
+
+        Returns:
+            `list[dict]`: A list of dictionaries containing expert information, including similarity scores.
+        """
+        found = labels >= 0
+        sim, labels = sim[found], labels[found]
+        if is_id_mapped(self.index):
+            positions = self.expert_store.positions_of_ids(labels)
+            # Experts added to the index after the description store was built
+            known = positions >= 0
+            if not known.all():
+                logger.warning(
+                    f"Experts {labels[~known].tolist()} have no description, skipping them"
+                )
+                sim = sim[known]
+                positions = positions[known]
+        else:
+            positions = labels
+        expert_info_list = self.expert_store.records(positions)
+        for expert_info, similarity in zip(expert_info_list, sim):
+            expert_info["similarity"] = float(similarity)
         return expert_info_list
 
     def display(self, results: dict[str, Any]) -> list[str]:
@@ -245,23 +524,172 @@ class CollaborationSystem(System):
         Returns:
             `list[dict]`: The top N ranked experts with added descriptions.
         """
-        experts_dict = {
-            expert["expert_name"]: expert["description"] for expert in experts
-        }
-
+        recalled_ids = {expert["expert_id"] for expert in experts}
         for expert_result in results["sorted_experts"][:num]:
-            expert_name = expert_result["name"]
-
-            if expert_name in experts_dict:
-                expert_result["description"] = experts_dict[expert_name]
+            # Several experts may share a name, only the recalled one is described
+            for position in self.expert_store.positions_of_name(expert_result["name"]):
+                if self.expert_store.expert_ids[position] in recalled_ids:
+                    expert_result["description"] = self.expert_store.descriptions[
+                        position
+                    ]
+                    break
         return results["sorted_experts"][:num]
 
+    def rank(
+        self,
+        user_input: list[str],
+        reset: bool = True,
+        top_k: int = 10,
+        num: int = 3,
+        filters: Optional[dict] = None,
+    ) -> tuple[Any, list[dict], list[str]]:
+        """
+        Run every stage up to the Recommender: project analysis, recall and ranking.
+
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+            `reset` (`bool`): Whether to reset the system state before processing. Defaults to True.
+            `top_k` (`int`): The number of top similar experts to recall. Defaults to 10.
+            `num` (`int`): The number of experts to recommend. Defaults to 3.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+
+        Returns:
+            `tuple[Any, list[dict], list[str]]`: The project analysis, the top `num` ranked experts with descriptions, and the formatted ranking.
+        """
+        self.start_forward(user_input, reset)
+        project, experts = self.analyze_and_recall(user_input, top_k, filters)
+        results = json.loads(
+            self._timed(
+                "recommender", self.recommender, project=project, experts=experts
+            )
+        )
+        final_results = self.display(results)
+        update_results = self.add_description(experts, results, num)
+        return project, update_results, final_results[:num]
+
+    async def arank(
+        self,
+        user_input: list[str],
+        reset: bool = True,
+        top_k: int = 10,
+        num: int = 3,
+        filters: Optional[dict] = None,
+    ) -> tuple[Any, list[dict], list[str]]:
+        """
+        Asynchronous version of `rank`.
+
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+            `reset` (`bool`): Whether to reset the system state before processing. Defaults to True.
+            `top_k` (`int`): The number of top similar experts to recall. Defaults to 10.
+            `num` (`int`): The number of experts to recommend. Defaults to 3.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+
+        Returns:
+            `tuple[Any, list[dict], list[str]]`: The project analysis, the top `num` ranked experts with descriptions, and the formatted ranking.
+        """
+        self.start_forward(user_input, reset)
+        project, experts = await self.aanalyze_and_recall(user_input, top_k, filters)
+        results = json.loads(
+            await self._atimed(
+                "recommender",
+                self.recommender.acall(project=project, experts=experts),
+            )
+        )
+        final_results = self.display(results)
+        update_results = self.add_description(experts, results, num)
+        return project, update_results, final_results[:num]
+
+    def explain(self, project: Any, experts: list[dict], log: bool = True) -> str:
+        """
+        Explain the recommendation with the Explainer.
+
+        Args:
+            `project` (`Any`): The project analysis.
+            `experts` (`list[dict]`): The top ranked experts with descriptions.
+            `log` (`bool`, optional): Whether to log the explanation to the web page, token by token with `stream`. An explanation produced in the background is only written to the log file. Defaults to `True`.
+
+        Returns:
+            `str`: The explanation.
+        """
+        if log and self.stream:
+            return self._timed(
+                "explainer",
+                self.log_stream,
+                self.explainer(project=project, experts=experts, stream=True),
+                self.explainer,
+            )
+        explanation = self._timed(
+            "explainer", self.explainer, project=project, experts=experts
+        )
+        if log:
+            self.log(explanation, self.explainer)
+        else:
+            logger.debug(explanation)
+        return explanation
+
+    async def aexplain(
+        self, project: Any, experts: list[dict], log: bool = True
+    ) -> str:
+        """
+        Asynchronous version of `explain`.
+
+        Args:
+            `project` (`Any`): The project analysis.
+            `experts` (`list[dict]`): The top ranked experts with descriptions.
+            `log` (`bool`, optional): Whether to log the explanation to the web page. Defaults to `True`.
+
+        Returns:
+            `str`: The explanation.
+        """
+        explanation = await self._atimed(
+            "explainer", self.explainer.acall(project=project, experts=experts)
+        )
+        if log:
+            self.log(explanation, self.explainer)
+        else:
+            logger.debug(explanation)
+        return explanation
+
+    def start_forward(self, user_input: list[str], reset: bool) -> None:
+        """
+        Prepare the system state for a forward pass and start its timer.
+
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+            `reset` (`bool`): Whether to reset the system state before processing.
+        """
+        self.manager_kwargs["history"] = self.chat_history
+        if len(user_input) != 2:
+            assert "Project name and project information are both needed."
+        if reset:
+            self.reset()
+        self.add_chat_history(user_input, role="user")
+        self.timings = {}
+        self.explanation = None
+        self.forward_start = time.perf_counter()
+
+    def finish_forward(self) -> None:
+        """
+        Record the total time of the forward pass and log the timings and cache statistics.
+        """
+        self.timings["total"] = time.perf_counter() - self.forward_start
+        self.log_timings()
+        if get_llm_cache() is not None:
+            logger.debug(f"LLM cache: {get_llm_cache().stats}")
+        if get_http_clients() is not None:
+            logger.debug(f"HTTP connections: {get_http_clients().stats}")
+        if get_rate_limiter() is not None:
+            logger.debug(f"Rate limiter: {get_rate_limiter().stats}")
+
     def forward(
         self,
         user_input: Optional[list[str]] = None,
         reset: bool = True,
         top_k: int = 10,
         num: int = 3,
+        filters: Optional[dict] = None,
+        explain: bool | str = True,
         **kwargs,
     ) -> Any:
         """
@@ -272,26 +700,87 @@ class CollaborationSystem(System):
             `reset` (`bool`): Whether to reset the system state before processing. Defaults to True.
             `top_k` (`int`): The number of top similar experts to recall. Defaults to 10.
             `num` (`int`): The number of experts to recommend. Defaults to 3.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+            `explain` (`bool | str`): Whether to run the Explainer. `True` waits for the explanation, `False` skips it (for batch callers), and `"background"` returns as soon as the ranking is ready while the explanation is produced in a background thread; `self.explanation` then holds its `Future`. Defaults to `True`.
             `**kwargs` (`Any`): Additional keyword arguments for the forward pass.
 
         Returns:
-            `Any`: The final recommended experts with explanations.
+            `Any`: The final recommended experts.
         """
-        self.manager_kwargs["history"] = self.chat_history
-        if len(user_input) != 2:
-            assert "Project name and project information are both needed."
-        if reset:
-            self.reset()
-        self.add_chat_history(user_input, role="user")
-        project = self.project_description(user_input)
-        self.log(project, self.project_analyst)
+        project, experts, ranking = self.rank(user_input, reset, top_k, num, filters)
+        if explain == "background":
+            self.explanation = self.background_executor.submit(
+                self.explain, project, experts, False
+            )
+        elif explain:
+            self.explanation = self.explain(project, experts)
+        self.finish_forward()
+        return ranking
+
+    def forward_progressive(
+        self,
+        user_input: list[str],
+        reset: bool = True,
+        top_k: int = 10,
+        num: int = 3,
+        filters: Optional[dict] = None,
+        explain: bool = True,
+    ) -> Generator[Any, None, None]:
+        """
+        Progressive forward pass: yield the ranking as soon as the Recommender finishes, then the explanation once the Explainer finishes. Everything runs in the caller's thread, so web logging keeps working.
 
-        experts = self.recall(user_input, top_k)
+        Args:
+            `user_input` (`list[str]`): A list containing the project name and project description.
+            `reset` (`bool`): Whether to reset the system state before processing. Defaults to True.
+            `top_k` (`int`): The number of top similar experts to recall. Defaults to 10.
+            `num` (`int`): The number of experts to recommend. Defaults to 3.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+            `explain` (`bool`, optional): Whether to run the Explainer after yielding the ranking. Defaults to `True`.
 
-        results = json.loads(self.recommender(project=project, experts=experts))
-        final_results = self.display(results)
-        update_results = self.add_description(experts, results, num)
+        Yields:
+            `Any`: The final recommended experts, then the explanation.
+        """
+        self.clear_web_log()
+        project, experts, ranking = self.rank(user_input, reset, top_k, num, filters)
+        yield ranking
+        if explain:
+            self.explanation = self.explain(project, experts)
+            yield self.explanation
+        self.finish_forward()
+
+    async def aforward(
+        self,
+        user_input: Optional[list[str]] = None,
+        reset: bool = True,
+        top_k: int = 10,
+        num: int = 3,
+        filters: Optional[dict] = None,
+        explain: bool | str = True,
+        **kwargs,
+    ) -> Any:
+        """
+        Asynchronous forward pass of the system. The agents await the LLM API and the recall runs in a worker thread, so one event loop can serve many concurrent recommendation requests. Concurrent requests on one system share its chat history and web log, so serve them with `reset=False` and without the web demo.
 
-        explain = self.explainer(project=project, experts=update_results)
-        self.log(explain, self.explainer)
-        return final_results[:num]
+        Args:
+            `user_input` (`Optional[list[str]]`): A list containing the project name and project description.
+            `reset` (`bool`): Whether to reset the system state before processing. Defaults to True.
+            `top_k` (`int`): The number of top similar experts to recall. Defaults to 10.
+            `num` (`int`): The number of experts to recommend. Defaults to 3.
+            `filters` (`Optional[dict]`): The recall filters, see `recall`. Defaults to `None`.
+            `explain` (`bool | str`): Whether to run the Explainer, see `forward`. With `"background"`, `self.explanation` holds an `asyncio.Task`. Defaults to `True`.
+            `**kwargs` (`Any`): Additional keyword arguments for the forward pass.
+
+        Returns:
+            `Any`: The final recommended experts.
+        """
+        project, experts, ranking = await self.arank(
+            user_input, reset, top_k, num, filters
+        )
+        if explain == "background":
+            self.explanation = asyncio.create_task(
+                self.aexplain(project, experts, False)
+            )
+        elif explain:
+            self.explanation = await self.aexplain(project, experts)
+        self.finish_forward()
+        return ranking
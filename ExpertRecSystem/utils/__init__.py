@@ -2,9 +2,35 @@ from ExpertRecSystem.utils.data import read_json, read_expert_data
 from ExpertRecSystem.utils.init import init_openai_api
 from ExpertRecSystem.utils.prompts import read_prompts
 from ExpertRecSystem.utils.string import format_step, format_chat_history
+from ExpertRecSystem.utils.budget import PromptBudget
+from ExpertRecSystem.utils.cache import (
+    EmbeddingCache,
+    EmbeddingStore,
+    get_embedding_cache,
+    get_model_id,
+    get_model_version,
+)
+from ExpertRecSystem.utils.store import ExpertStore, read_expert_store
+from ExpertRecSystem.utils.filters import ExpertFilter
+from ExpertRecSystem.utils.runner import BatchRunner
+from ExpertRecSystem.utils.embedding import (
+    OnnxEmbeddingModel,
+    export_onnx_model,
+    load_embedding_model,
+)
 from ExpertRecSystem.utils.web import add_chat_message, get_color, get_avatar, get_name
 from ExpertRecSystem.utils.faiss import (
     load_faiss_index,
+    build_faiss_index,
+    get_search_params,
     get_project_embedding,
+    get_project_embeddings,
+    get_batch_embeddings,
     find_similar_experts,
+    is_id_mapped,
+    supports_removal,
+    get_indexed_ids,
+    add_experts,
+    remove_experts,
+    upsert_experts,
 )
@@ -0,0 +1,151 @@
+import json
+from loguru import logger
+from typing import Callable
+
+
+class PromptBudget:
+    """
+    Fits a prompt made of a fixed head and a list of expert entries into a token budget. Expert entries are compacted to the given fields and dumped as JSON, similarity scores are rounded. If the entries do not fit, the longest descriptions are truncated to a common length first, and the lowest ranked experts are dropped only if the prompt does not fit even without descriptions. Truncation estimates tokens per character, so the prompt is counted again afterwards and cut further until it fits.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], budget: int) -> None:
+        """
+        Initialize the budget.
+
+        Args:
+            `count_tokens` (`Callable[[str], int]`): Counts the tokens of a text, see `BaseLLM.count_tokens`.
+            `budget` (`int`): The maximum number of prompt tokens.
+        """
+        self.count_tokens = count_tokens
+        self.budget = budget
+
+    @staticmethod
+    def compact(expert: dict, fields: list[str]) -> dict:
+        """
+        Keep the given fields of an expert and round the similarity score.
+
+        Args:
+            `expert` (`dict`): The expert information.
+            `fields` (`list[str]`): The fields to keep, in order.
+
+        Returns:
+            `dict`: The compact expert entry.
+        """
+        entry = {field: expert[field] for field in fields if field in expert}
+        if "similarity" in entry:
+            entry["similarity"] = round(float(entry["similarity"]), 3)
+        return entry
+
+    @staticmethod
+    def format_entry(i: int, entry: dict) -> str:
+        """
+        Format the `i`-th expert entry of the prompt.
+
+        Args:
+            `i` (`int`): The 1-based number of the expert.
+            `entry` (`dict`): The compact expert entry.
+
+        Returns:
+            `str`: The formatted entry.
+        """
+        return f"\n专家{i}:{json.dumps(entry, ensure_ascii=False)}\n"
+
+    @staticmethod
+    def _cap(tokens: list[int], available: int) -> int:
+        # The largest per-description cap whose total fits into `available`
+        if sum(tokens) <= available:
+            return max(tokens, default=0)
+        remaining = available
+        for k, t in enumerate(sorted(tokens)):
+            n = len(tokens) - k
+            if t * n > remaining:
+                return remaining // n
+            remaining -= t
+        return remaining
+
+    def _join(self, head: str, entries: list[dict]) -> str:
+        return head + "".join(
+            self.format_entry(i, entry) for i, entry in enumerate(entries, start=1)
+        )
+
+    def build(
+        self, head: str, experts: list[dict], fields: list[str]
+    ) -> tuple[str, dict[str, int]]:
+        """
+        Build the prompt from the head and the expert entries within the budget.
+
+        Args:
+            `head` (`str`): The formatted prompt template.
+            `experts` (`list[dict]`): The experts, best first.
+            `fields` (`list[str]`): The expert fields to include, see `compact`.
+
+        Returns:
+            `tuple[str, dict[str, int]]`: The prompt, and the token counts of the head, the experts and the whole prompt together with the number of truncated and dropped experts.
+        """
+        entries = [self.compact(expert, fields) for expert in experts]
+        head_tokens = self.count_tokens(head)
+        description_tokens = [
+            self.count_tokens(entry.get("description", "")) for entry in entries
+        ]
+        # Cost of each entry apart from its description
+        fixed_tokens = [
+            self.count_tokens(
+                self.format_entry(
+                    i, {**entry, "description": ""} if "description" in entry else entry
+                )
+            )
+            for i, entry in enumerate(entries, start=1)
+        ]
+        available = self.budget - head_tokens - sum(fixed_tokens)
+        dropped = 0
+        while entries and available < 0:
+            entries.pop()
+            available += fixed_tokens.pop()
+            description_tokens.pop()
+            dropped += 1
+        cap = self._cap(description_tokens, available)
+        truncated = set()
+        for i, (entry, tokens) in enumerate(zip(entries, description_tokens)):
+            if tokens > cap:
+                # Truncate in proportion, leaving a token for the ellipsis
+                length = len(entry["description"]) * max(cap - 1, 0) // tokens
+                entry["description"] = entry["description"][:length] + "…"
+                truncated.add(i)
+        prompt = self._join(head, entries)
+        total_tokens = self.count_tokens(prompt)
+        # Characters per token vary, e.g. between Chinese and English text
+        while entries and total_tokens > self.budget:
+            overflow = total_tokens - self.budget
+            i = max(
+                range(len(entries)),
+                key=lambda k: len(entries[k].get("description", "").rstrip("…")),
+            )
+            description = entries[i].get("description", "").rstrip("…")
+            if description:
+                tokens = max(self.count_tokens(description), 1)
+                cut = max(-(-overflow * len(description) // tokens), 1)
+                entries[i]["description"] = description[:-cut] + "…"
+                truncated.add(i)
+            else:
+                entries.pop()
+                truncated.discard(len(entries))
+                dropped += 1
+            prompt = self._join(head, entries)
+            total_tokens = self.count_tokens(prompt)
+        if total_tokens > self.budget:
+            logger.warning(
+                f"The prompt head alone exceeds the prompt budget of {self.budget} tokens"
+            )
+        stats = {
+            "head": head_tokens,
+            "experts": total_tokens - head_tokens,
+            "total": total_tokens,
+            "budget": self.budget,
+            "truncated": len(truncated),
+            "dropped": dropped,
+        }
+        if dropped:
+            logger.warning(
+                f"Dropped the last {dropped} experts to fit the prompt budget of {self.budget} tokens"
+            )
+        return prompt, stats
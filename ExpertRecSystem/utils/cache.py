@@ -0,0 +1,332 @@
+import os
+import json
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a text before it is used as a cache key. Applies NFKC normalization (full-width and half-width forms become identical) and collapses all whitespace.
+
+    Args:
+        `text` (`str`): The text to normalize.
+
+    Returns:
+        `str`: The normalized text.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def get_model_version(model_path: str) -> str:
+    """
+    Get a version fingerprint of an embedding model. The fingerprint covers the name, size and modification time of every file in the model directory, or in the directory of a single model file so that ONNX external-data files are included. Replacing or fine-tuning the model therefore invalidates cached embeddings.
+
+    Args:
+        `model_path` (`str`): The path to the model directory or model file.
+
+    Returns:
+        `str`: A short hexadecimal fingerprint.
+    """
+    digest = hashlib.sha256(os.path.normpath(model_path).encode("utf-8"))
+    model_dir = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+    if os.path.isdir(model_dir or "."):
+        for name in sorted(os.listdir(model_dir or ".")):
+            path = os.path.join(model_dir, name)
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def get_model_id(recall_config: dict) -> str:
+    """
+    Get the identity of the embedding model selected by the recall config: its backend, path and version fingerprint.
+
+    Args:
+        `recall_config` (`dict`): The recall config.
+
+    Returns:
+        `str`: The model identity.
+    """
+    backend = recall_config.get("emb_backend", "torch")
+    if backend == "onnx":
+        model_path = recall_config["onnx"]["model_path"]
+    else:
+        model_path = recall_config["emb_model_path"]
+    return f"{backend}:{model_path}@{get_model_version(model_path)}"
+
+
+class EmbeddingCache:
+    """
+    A bounded LRU cache of text embeddings with an optional on-disk tier. Keys are derived from the normalized text and the model identity, so a different model never serves stale embeddings. The cache is thread-safe.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_size: int = 1024,
+        disk_path: Optional[str] = None,
+        disk_max_size: int = 100000,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            `model_id` (`str`): The identity of the embedding model, e.g. its path and version fingerprint.
+            `max_size` (`int`, optional): The maximum number of embeddings kept in memory. Defaults to `1024`.
+            `disk_path` (`Optional[str]`): The directory of the on-disk tier. The disk tier is disabled if `None`. Defaults to `None`.
+            `disk_max_size` (`int`, optional): The maximum number of embeddings kept on disk. The least recently written files are evicted first. Defaults to `100000`.
+        """
+        self.model_id = model_id
+        self.max_size = max_size
+        self.disk_path = disk_path
+        self.disk_max_size = disk_max_size
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._disk_size = 0
+        if self.disk_path is not None:
+            os.makedirs(self.disk_path, exist_ok=True)
+            self._disk_size = len(self._disk_files())
+
+    def key(self, text: str) -> str:
+        """
+        Get the cache key of a text.
+
+        Args:
+            `text` (`str`): The text.
+
+        Returns:
+            `str`: The cache key.
+        """
+        payload = json.dumps([self.model_id, normalize_text(text)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        Look up the embedding of a text, first in memory and then on disk.
+
+        Args:
+            `text` (`str`): The text.
+
+        Returns:
+            `Optional[np.ndarray]`: The cached embedding, or `None` on a miss.
+        """
+        key = self.key(text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+        embedding = self._read_disk(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, embedding)
+        return embedding
+
+    def put(self, text: str, embedding: np.ndarray) -> None:
+        """
+        Store the embedding of a text.
+
+        Args:
+            `text` (`str`): The text.
+            `embedding` (`np.ndarray`): The embedding.
+        """
+        key = self.key(text)
+        embedding = np.array(embedding, dtype=np.float32)
+        with self._lock:
+            self._put_memory(key, embedding)
+        self._write_disk(key, embedding)
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """
+        Hit, miss and eviction counters of the cache.
+
+        Returns:
+            `dict[str, int | float]`: The counters and the overall hit rate.
+        """
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "size": len(self._memory),
+            "disk_size": self._disk_size,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def _put_memory(self, key: str, embedding: np.ndarray) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key[:2], key + ".npy")
+
+    def _disk_files(self) -> list[str]:
+        return [
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.disk_path)
+            for name in names
+            if name.endswith(".npy")
+        ]
+
+    def _read_disk(self, key: str) -> Optional[np.ndarray]:
+        if self.disk_path is None:
+            return None
+        try:
+            return np.load(self._disk_file(key))
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def _write_disk(self, key: str, embedding: np.ndarray) -> None:
+        if self.disk_path is None:
+            return
+        path = self._disk_file(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embedding)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_size += 1
+            if self._disk_size <= self.disk_max_size:
+                return
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        # Drop the oldest tenth so that pruning does not run on every write
+        files = []
+        for path in self._disk_files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        files = [path for _, path in sorted(files)]
+        keep = int(self.disk_max_size * 0.9)
+        for path in files[: max(len(files) - keep, 0)]:
+            try:
+                os.remove(path)
+                self.disk_evictions += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_size = len(self._disk_files())
+
+
+def get_embedding_cache(recall_config: dict) -> Optional[EmbeddingCache]:
+    """
+    Build the project embedding cache described by the `embedding_cache` section of the recall config.
+
+    Args:
+        `recall_config` (`dict`): The recall config.
+
+    Returns:
+        `Optional[EmbeddingCache]`: The cache, or `None` if the recall config has no `embedding_cache` section.
+    """
+    cache_config = recall_config.get("embedding_cache")
+    if cache_config is None:
+        return None
+    return EmbeddingCache(model_id=get_model_id(recall_config), **cache_config)
+
+
+class EmbeddingStore:
+    """
+    A persistent store of text embeddings keyed by a content hash of the text and the model identity. Rebuilds look up every text and only embed the texts that are new or changed. The store is kept on disk as one `.npz` file holding the keys and the embedding matrix, so the two can never get out of step, and is rewritten atomically on `save`.
+    """
+
+    def __init__(self, store_dir: str, model_id: str) -> None:
+        """
+        Load the store, starting empty if it does not exist yet.
+
+        Args:
+            `store_dir` (`str`): The directory of the store.
+            `model_id` (`str`): The identity of the embedding model, e.g. its path and version fingerprint.
+        """
+        self.store_dir = store_dir
+        self.model_id = model_id
+        self._embeddings: dict[bytes, np.ndarray] = {}
+        self.path = os.path.join(store_dir, "store.npz")
+        if os.path.exists(self.path):
+            with np.load(self.path) as store:
+                # Raw digests as uint8 rows, a bytes dtype would strip trailing NULs
+                keys = [row.tobytes() for row in store["keys"]]
+                self._embeddings = dict(zip(keys, store["embeddings"]))
+
+    def key(self, text: str) -> bytes:
+        """
+        Get the store key of a text.
+
+        Args:
+            `text` (`str`): The text.
+
+        Returns:
+            `bytes`: The SHA-256 digest of the model identity and the text.
+        """
+        payload = json.dumps([self.model_id, text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return len(self._embeddings)
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        Look up an embedding.
+
+        Args:
+            `key` (`bytes`): The store key, see `key`.
+
+        Returns:
+            `Optional[np.ndarray]`: The stored embedding, or `None` if the text is new or changed.
+        """
+        return self._embeddings.get(key)
+
+    def put(self, key: bytes, embedding: np.ndarray) -> None:
+        """
+        Store an embedding.
+
+        Args:
+            `key` (`bytes`): The store key, see `key`.
+            `embedding` (`np.ndarray`): The embedding.
+        """
+        self._embeddings[key] = np.asarray(embedding, dtype=np.float32)
+
+    def save(self, keep: Optional[list[bytes]] = None) -> None:
+        """
+        Write the store to disk atomically.
+
+        Args:
+            `keep` (`Optional[list[bytes]]`): The keys to keep, e.g. those of the current build, so that embeddings of removed or changed texts do not accumulate. Keeps everything if `None`.
+        """
+        keys = list(self._embeddings) if keep is None else list(dict.fromkeys(keep))
+        self._embeddings = {key: self._embeddings[key] for key in keys}
+        os.makedirs(self.store_dir, exist_ok=True)
+        key_array = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, 32)
+        embeddings = (
+            np.stack([self._embeddings[key] for key in keys])
+            if keys
+            else np.zeros((0, 0), dtype=np.float32)
+        )
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=key_array, embeddings=embeddings)
+        os.replace(tmp_path, self.path)
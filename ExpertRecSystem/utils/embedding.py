@@ -0,0 +1,122 @@
+import os
+import torch
+import numpy as np
+from types import SimpleNamespace
+from typing import Optional
+from loguru import logger
+from transformers import AutoTokenizer, AutoModel
+
+
+class OnnxEmbeddingModel:
+    """
+    A CPU embedding model backed by ONNX Runtime. It follows the calling convention of the transformers model it was exported from: `model(**inputs).last_hidden_state`, so it can be used wherever the PyTorch model is used.
+    """
+
+    def __init__(self, onnx_path: str, num_threads: Optional[int] = None) -> None:
+        """
+        Initialize the ONNX Runtime session.
+
+        Args:
+            `onnx_path` (`str`): The path to the exported (optionally quantized) ONNX model.
+            `num_threads` (`Optional[int]`): The number of intra-op threads. Defaults to the ONNX Runtime default.
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        hidden_size = self.session.get_outputs()[0].shape[-1]
+        self.config = SimpleNamespace(hidden_size=hidden_size, _name_or_path=onnx_path)
+
+    def to(self, device: torch.device) -> "OnnxEmbeddingModel":
+        if torch.device(device).type != "cpu":
+            logger.warning("The ONNX embedding backend only runs on CPU")
+        return self
+
+    def eval(self) -> "OnnxEmbeddingModel":
+        return self
+
+    def __call__(self, **inputs: torch.Tensor) -> SimpleNamespace:
+        feeds = {
+            name: inputs[name].cpu().numpy().astype(np.int64)
+            for name in self.input_names
+        }
+        last_hidden_state = self.session.run(None, feeds)[0]
+        return SimpleNamespace(last_hidden_state=torch.from_numpy(last_hidden_state))
+
+
+def export_onnx_model(model_path: str, output_dir: str, quantize: bool = False) -> str:
+    """
+    Export a transformers embedding model to ONNX, optionally with dynamic int8 weight quantization.
+
+    Args:
+        `model_path` (`str`): The path to the transformers model.
+        `output_dir` (`str`): The directory to write `model.onnx` (and `model_int8.onnx`) into.
+        `quantize` (`bool`, optional): Whether to also write a dynamically int8-quantized model. Defaults to `False`.
+
+    Returns:
+        `str`: The path to the exported model that should be used for serving.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path).eval()
+    inputs = tokenizer(["专家推荐"], return_tensors="pt")
+    onnx_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (inputs["input_ids"], inputs["attention_mask"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=17,
+        )
+    tokenizer.save_pretrained(output_dir)
+    if not quantize:
+        return onnx_path
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    int8_path = os.path.join(output_dir, "model_int8.onnx")
+    quantize_dynamic(
+        onnx_path,
+        int8_path,
+        weight_type=QuantType.QInt8,
+        use_external_data_format=True,
+    )
+    return int8_path
+
+
+def load_embedding_model(recall_config: dict, device: torch.device) -> tuple:
+    """
+    Load the tokenizer and embedding model selected by `emb_backend` in the recall config. `torch` loads `emb_model_path` with transformers; `onnx` loads `onnx.model_path` with ONNX Runtime on CPU.
+
+    Args:
+        `recall_config` (`dict`): The recall config.
+        `device` (`torch.device`): The device on which the PyTorch model will run.
+
+    Returns:
+        `tuple`: The tokenizer and the embedding model.
+    """
+    backend = recall_config.get("emb_backend", "torch")
+    tokenizer = AutoTokenizer.from_pretrained(recall_config["emb_model_path"])
+    if backend == "torch":
+        model = AutoModel.from_pretrained(recall_config["emb_model_path"]).to(device)
+    elif backend == "onnx":
+        onnx_config = recall_config["onnx"]
+        model = OnnxEmbeddingModel(
+            onnx_config["model_path"], onnx_config.get("num_threads")
+        )
+    else:
+        raise ValueError(f"Embedding backend {backend} is not supported.")
+    return tokenizer, model.eval()
@@ -1,24 +1,241 @@
+import time
 import faiss
 import torch
 import numpy as np
+from tqdm import tqdm
+from loguru import logger
+from typing import Optional
+from ExpertRecSystem.utils.cache import EmbeddingCache
 
 
-def load_faiss_index(index_path: str) -> faiss.Index:
+def load_faiss_index(
+    index_path: str, index_config: Optional[dict] = None, mmap: Optional[bool] = None
+) -> faiss.Index:
     """
     Load a FAISS index from the specified file path.
 
     Args:
         `index_path` (`str`): The path to the FAISS index file.
+        `index_config` (`Optional[dict]`): The `index` section of the recall config. Its search-time parameters (`nprobe`, `ef_search`) become the defaults of the loaded index. Defaults to `None`.
+        `mmap` (`Optional[bool]`): Whether to memory-map the index file read-only instead of reading it into private memory, so that processes on one host share the page cache. The `type` entry of `index_config` selects the mapping mode. Defaults to the `mmap` entry of `index_config`, or `False`.
 
     Returns:
         `faiss.Index`: The loaded FAISS index.
     """
-    index = faiss.read_index(index_path)
+    index_config = index_config or {}
+    if mmap is None:
+        mmap = index_config.get("mmap", False)
+    if mmap:
+        # IVF inverted lists are mapped with IO_FLAG_MMAP, flat codes (flat and
+        # HNSW storage) with IO_FLAG_MMAP_IFC; FAISS rejects the two combined
+        if index_config.get("type", "flat") in ["ivf", "ivfpq"]:
+            mmap_flag = faiss.IO_FLAG_MMAP
+        else:
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        io_flags = mmap_flag | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(index_path, io_flags)
+    else:
+        index = faiss.read_index(index_path)
+    if index_config:
+        parameter_space = faiss.ParameterSpace()
+        index_type = index_config.get("type", "flat")
+        if index_type in ["ivf", "ivfpq"] and "nprobe" in index_config:
+            parameter_space.set_index_parameter(index, "nprobe", index_config["nprobe"])
+        elif index_type == "hnsw" and "ef_search" in index_config:
+            parameter_space.set_index_parameter(
+                index, "efSearch", index_config["ef_search"]
+            )
     return index
 
 
+def build_faiss_index(
+    dimension: int, index_config: Optional[dict] = None, num_vectors: int = 0
+) -> faiss.Index:
+    """
+    Build an empty inner-product FAISS index of the family chosen in the recall config.
+
+    Supported `type` values are `flat` (exact search), `ivf` (`nlist`), `hnsw` (`hnsw_m`, `ef_construction`) and `ivfpq` (`nlist`, `pq_m`, `pq_nbits`). `ivf` and `ivfpq` indexes must be trained before vectors are added. HNSW indexes do not support removing vectors.
+
+    Args:
+        `dimension` (`int`): The dimension of the embeddings.
+        `index_config` (`Optional[dict]`): The `index` section of the recall config. Defaults to a flat index.
+        `num_vectors` (`int`, optional): The number of training vectors, used to cap `nlist`. Defaults to 0 (no cap).
+
+    Returns:
+        `faiss.Index`: The untrained, empty FAISS index.
+    """
+    index_config = index_config or {}
+    index_type = index_config.get("type", "flat")
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimension)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(
+            dimension, index_config.get("hnsw_m", 32), faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = index_config.get("ef_construction", 200)
+        return index
+    nlist = index_config.get("nlist", 1024)
+    if 0 < num_vectors < nlist:
+        logger.warning(f"nlist={nlist} exceeds {num_vectors} vectors, capping it")
+        nlist = num_vectors
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf":
+        return faiss.IndexIVFFlat(
+            quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT
+        )
+    if index_type == "ivfpq":
+        return faiss.IndexIVFPQ(
+            quantizer,
+            dimension,
+            nlist,
+            index_config.get("pq_m", 64),
+            index_config.get("pq_nbits", 8),
+            faiss.METRIC_INNER_PRODUCT,
+        )
+    raise ValueError(f"Index type {index_type} is not supported.")
+
+
+def get_search_params(
+    index_config: Optional[dict] = None,
+    sel: Optional[faiss.IDSelector] = None,
+) -> Optional[faiss.SearchParameters]:
+    """
+    Build the per-query search parameters of the index family chosen in the recall config.
+
+    Args:
+        `index_config` (`Optional[dict]`): The `index` section of the recall config. Defaults to `None`.
+        `sel` (`Optional[faiss.IDSelector]`): The selector restricting the search to the allowed labels, see `ExpertFilter`. Defaults to `None`.
+
+    Returns:
+        `Optional[faiss.SearchParameters]`: The search parameters, or `None` if the index family has no search-time parameters and there is no selector.
+    """
+    index_config = index_config or {}
+    index_type = index_config.get("type", "flat")
+    if index_type in ["ivf", "ivfpq"]:
+        params = faiss.SearchParametersIVF(nprobe=index_config.get("nprobe", 32))
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=index_config.get("ef_search", 128))
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if sel is not None:
+        params.sel = sel
+        params.referenced_objects = [sel]  # The parameters do not own the selector
+    return params
+
+
+def is_id_mapped(index: faiss.Index) -> bool:
+    """
+    Check whether the FAISS index labels its vectors with expert IDs instead of row positions.
+
+    Args:
+        `index` (`faiss.Index`): The FAISS index.
+
+    Returns:
+        `bool`: `True` if the index is an ID-mapped index.
+    """
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """
+    Check whether vectors can be removed from the FAISS index. HNSW graphs do not support removal.
+
+    Args:
+        `index` (`faiss.Index`): The FAISS index, optionally ID-mapped.
+
+    Returns:
+        `bool`: `True` if `remove_ids` is supported.
+    """
+    if is_id_mapped(index):
+        index = faiss.downcast_index(index.index)
+    return not isinstance(index, faiss.IndexHNSW)
+
+
+def get_indexed_ids(index: faiss.Index) -> np.ndarray:
+    """
+    Get the expert IDs stored in an ID-mapped FAISS index.
+
+    Args:
+        `index` (`faiss.Index`): The ID-mapped FAISS index.
+
+    Returns:
+        `np.ndarray`: The indexed expert IDs.
+    """
+    assert is_id_mapped(index), "The index is not keyed by expert_id."
+    return faiss.vector_to_array(index.id_map)
+
+
+def add_experts(
+    index: faiss.Index, embeddings: np.ndarray, expert_ids: np.ndarray
+) -> None:
+    """
+    Add expert embeddings to an ID-mapped FAISS index.
+
+    Args:
+        `index` (`faiss.Index`): The ID-mapped FAISS index.
+        `embeddings` (`np.ndarray`): The normalized expert embeddings.
+        `expert_ids` (`np.ndarray`): The expert IDs, one per embedding.
+    """
+    assert is_id_mapped(index), "The index is not keyed by expert_id."
+    index.add_with_ids(
+        np.ascontiguousarray(embeddings, dtype=np.float32),
+        np.asarray(expert_ids, dtype=np.int64),
+    )
+
+
+def remove_experts(index: faiss.Index, expert_ids: np.ndarray) -> int:
+    """
+    Remove experts from an ID-mapped FAISS index.
+
+    Args:
+        `index` (`faiss.Index`): The ID-mapped FAISS index.
+        `expert_ids` (`np.ndarray`): The expert IDs to remove.
+
+    Returns:
+        `int`: The number of vectors removed.
+    """
+    assert is_id_mapped(index), "The index is not keyed by expert_id."
+    return index.remove_ids(np.asarray(expert_ids, dtype=np.int64))
+
+
+def upsert_experts(
+    index: faiss.Index, embeddings: np.ndarray, expert_ids: np.ndarray
+) -> int:
+    """
+    Add experts to an ID-mapped FAISS index, replacing the vectors of experts that are already indexed. Indexes that do not support removal (HNSW) only accept experts that are not indexed yet.
+
+    Args:
+        `index` (`faiss.Index`): The ID-mapped FAISS index.
+        `embeddings` (`np.ndarray`): The normalized expert embeddings.
+        `expert_ids` (`np.ndarray`): The expert IDs, one per embedding.
+
+    Returns:
+        `int`: The number of existing vectors that were replaced.
+
+    Raises:
+        `ValueError`: If the index does not support removal and some experts are already indexed.
+    """
+    if supports_removal(index):
+        replaced = remove_experts(index, expert_ids)
+    else:
+        existing = np.intersect1d(get_indexed_ids(index), expert_ids)
+        if len(existing) > 0:
+            raise ValueError(
+                f"The index does not support removal, cannot update experts {existing.tolist()}."
+            )
+        replaced = 0
+    add_experts(index, embeddings, expert_ids)
+    return replaced
+
+
 def get_project_embedding(
-    project_description: str, tokenizer, model, device: torch.device
+    project_description: str,
+    tokenizer,
+    model,
+    device: torch.device,
+    cache: Optional[EmbeddingCache] = None,
 ) -> np.ndarray:
     """
     Generate an embedding for the given project description using a pre-trained transformer model.
@@ -28,10 +245,15 @@ def get_project_embedding(
         `tokenizer`: The tokenizer to convert the text into token IDs.
         `model`: The pre-trained transformer model to generate the embedding.
         `device` (`torch.device`): The device (CPU or GPU) on which the model will run.
+        `cache` (`Optional[EmbeddingCache]`): The embedding cache to consult before running the model. Defaults to `None`.
 
     Returns:
         `np.ndarray`: The normalized embedding of the project description.
     """
+    if cache is not None:
+        embedding = cache.get(project_description)
+        if embedding is not None:
+            return embedding
     inputs = tokenizer(
         project_description,
         return_tensors="pt",
@@ -43,11 +265,116 @@ def get_project_embedding(
         outputs = model(**inputs)
     embedding = outputs.last_hidden_state[:, 0, :].cpu().numpy()
     embedding = embedding / np.linalg.norm(embedding, axis=1, keepdims=True)
+    if cache is not None:
+        cache.put(project_description, embedding)
     return embedding
 
 
+def get_batch_embeddings(
+    texts: list[str],
+    tokenizer,
+    model,
+    device: torch.device,
+    batch_size: int = 32,
+    max_length: int = 512,
+    show_progress: bool = False,
+) -> np.ndarray:
+    """
+    Generate embeddings for many texts with batched forward passes. Texts are sorted by token length and packed into batches that are padded only to their own longest sequence, so short texts do not pay for long ones. The embeddings are returned in the original order.
+
+    Args:
+        `texts` (`list[str]`): The texts to embed.
+        `tokenizer`: The tokenizer to convert the texts into token IDs.
+        `model`: The pre-trained transformer model to generate the embeddings.
+        `device` (`torch.device`): The device (CPU or GPU) on which the model will run.
+        `batch_size` (`int`, optional): The number of texts per forward pass. Defaults to 32.
+        `max_length` (`int`, optional): The maximum number of tokens per text. Defaults to 512.
+        `show_progress` (`bool`, optional): Whether to show a progress bar. Defaults to `False`.
+
+    Returns:
+        `np.ndarray`: The normalized CLS embeddings, one row per text in the input order.
+    """
+    texts = list(texts)
+    if len(texts) == 0:
+        return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+    start = time.perf_counter()
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    order = np.argsort([len(ids) for ids in encodings["input_ids"]], kind="stable")
+    embeddings = np.zeros((len(texts), model.config.hidden_size), dtype=np.float32)
+    batches = range(0, len(texts), batch_size)
+    if show_progress:
+        batches = tqdm(batches, desc="Generating embeddings")
+    for begin in batches:
+        batch_indices = order[begin : begin + batch_size]
+        features = [
+            {key: encodings[key][i] for key in encodings.keys()} for i in batch_indices
+        ]
+        inputs = tokenizer.pad(features, padding=True, return_tensors="pt").to(device)
+        with torch.no_grad():
+            outputs = model(**inputs)
+        batch_embeddings = outputs.last_hidden_state[:, 0, :].float().cpu().numpy()
+        embeddings[batch_indices] = batch_embeddings / np.linalg.norm(
+            batch_embeddings, axis=1, keepdims=True
+        )
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Embedded {len(texts)} texts in {elapsed:.2f}s ({len(texts) / elapsed:.1f} texts/s)"
+    )
+    return embeddings
+
+
+def get_project_embeddings(
+    project_descriptions: list[str],
+    tokenizer,
+    model,
+    device: torch.device,
+    batch_size: int = 32,
+    cache: Optional[EmbeddingCache] = None,
+) -> np.ndarray:
+    """
+    Generate embeddings for many project descriptions. Cached embeddings are reused and only the misses go through batched forward passes, see `get_batch_embeddings`.
+
+    Args:
+        `project_descriptions` (`list[str]`): The textual descriptions of the projects.
+        `tokenizer`: The tokenizer to convert the texts into token IDs.
+        `model`: The pre-trained transformer model to generate the embeddings.
+        `device` (`torch.device`): The device (CPU or GPU) on which the model will run.
+        `batch_size` (`int`, optional): The number of texts per forward pass. Defaults to 32.
+        `cache` (`Optional[EmbeddingCache]`): The embedding cache to consult before running the model. Defaults to `None`.
+
+    Returns:
+        `np.ndarray`: The normalized embeddings, one row per project in the input order.
+    """
+    embeddings = np.zeros(
+        (len(project_descriptions), model.config.hidden_size), dtype=np.float32
+    )
+    missing: dict[str, list[int]] = {}
+    for i, project_description in enumerate(project_descriptions):
+        if project_description in missing:
+            missing[project_description].append(i)
+            continue
+        embedding = None if cache is None else cache.get(project_description)
+        if embedding is None:
+            missing[project_description] = [i]
+        else:
+            embeddings[i] = embedding.reshape(-1)
+    if missing:
+        texts = list(missing)
+        computed = get_batch_embeddings(
+            texts, tokenizer, model, device, batch_size=batch_size
+        )
+        for text, embedding in zip(texts, computed):
+            embeddings[missing[text]] = embedding
+            if cache is not None:
+                cache.put(text, embedding[None, :])
+    return embeddings
+
+
 def find_similar_experts(
-    project_embedding: np.ndarray, index: faiss.Index, top_k: int = 5
+    project_embedding: np.ndarray,
+    index: faiss.Index,
+    top_k: int = 5,
+    params: Optional[faiss.SearchParameters] = None,
 ) -> tuple[np.ndarray, np.ndarray]:
     """
     Find the most similar experts to the project based on the project embedding.
@@ -56,12 +383,13 @@ def find_similar_experts(
         `project_embedding` (`np.ndarray`): The embedding of the project description.
         `index` (`faiss.Index`): The FAISS index containing expert embeddings.
         `top_k` (`int`, optional): The number of top similar experts to retrieve. Defaults to 5.
+        `params` (`Optional[faiss.SearchParameters]`): The search-time parameters for this query, see `get_search_params`. Defaults to `None`.
 
     Returns:
         `tuple[np.ndarray, np.ndarray]`: A tuple containing:
             - `cosine_similarities` (`np.ndarray`): The cosine similarity scores of the top similar experts.
             - `indices` (`np.ndarray`): The indices of the top similar experts in the FAISS index.
     """
-    distances, indices = index.search(project_embedding, top_k)
+    distances, indices = index.search(project_embedding, top_k, params=params)
     cosine_similarities = distances[0]
     return cosine_similarities, indices
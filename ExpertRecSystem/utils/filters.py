@@ -0,0 +1,117 @@
+import faiss
+import numpy as np
+from loguru import logger
+from typing import Optional
+from ExpertRecSystem.utils.store import ExpertStore
+
+
+class ExpertFilter:
+    """
+    Compiles recall filters into FAISS ID selectors that are applied during the index search, so filtered-out experts never take a place in the top-k. Filters are combined as bitmaps over the store positions, whose size does not depend on how large or sparse the expert IDs are. A plain index is searched with the bitmap itself, and an ID-mapped index with the batch of allowed expert IDs.
+
+    Supported filters:
+        `specialist` (`list[str]`): Keep only experts with one of these specialties.
+        `exclude_workplace` (`list[str]`): Drop experts working at one of these workplaces, e.g. the purchasing university.
+        `exclude_expert_id` (`list[int]`): Drop these experts.
+    """
+
+    def __init__(self, store: ExpertStore, id_mapped: bool) -> None:
+        """
+        Precompute the bitmap of all experts and one bitmap per specialty, and group the store positions by workplace.
+
+        Args:
+            `store` (`ExpertStore`): The expert store.
+            `id_mapped` (`bool`): Whether the index is keyed by `expert_id`.
+        """
+        self.store = store
+        self.id_mapped = id_mapped
+        self.num_positions = len(store)
+        self.all_bitmap = self._pack(np.arange(self.num_positions))
+        self.specialist_bitmaps = {
+            value: self._pack(np.flatnonzero(store.specialist_codes == code))
+            for code, value in enumerate(store.specialist_values)
+        }
+        order = np.argsort(store.workplace_codes, kind="stable")
+        bounds = np.searchsorted(
+            store.workplace_codes[order], np.arange(len(store.workplace_values) + 1)
+        )
+        self.workplace_positions = {
+            value: order[bounds[code] : bounds[code + 1]]
+            for code, value in enumerate(store.workplace_values)
+        }
+        logger.debug(
+            f"Filter bitmaps: {len(self.specialist_bitmaps) + 1} x {self.all_bitmap.nbytes} bytes"
+        )
+
+    def _pack(self, positions: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.num_positions, dtype=bool)
+        mask[positions] = True
+        return np.packbits(mask, bitorder="little")
+
+    def _clear(self, bitmap: np.ndarray, positions: np.ndarray) -> None:
+        positions = positions[(positions >= 0) & (positions < self.num_positions)]
+        np.bitwise_and.at(
+            bitmap, positions >> 3, ~np.left_shift(1, positions & 7).astype(np.uint8)
+        )
+
+    def compile(self, filters: Optional[dict] = None) -> Optional[np.ndarray]:
+        """
+        Compile filters into a bitmap of the allowed store positions.
+
+        Args:
+            `filters` (`Optional[dict]`): The filters, see the class docstring. Defaults to `None`.
+
+        Returns:
+            `Optional[np.ndarray]`: The little-endian packed bitmap, or `None` if no filter is set.
+
+        Raises:
+            `ValueError`: If a filter is not supported.
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value}
+        unsupported = set(filters) - {
+            "specialist",
+            "exclude_workplace",
+            "exclude_expert_id",
+        }
+        if unsupported:
+            raise ValueError(f"Filters {sorted(unsupported)} are not supported.")
+        if not filters:
+            return None
+        if "specialist" in filters:
+            bitmap = np.zeros_like(self.all_bitmap)
+            for specialist in filters["specialist"]:
+                if specialist in self.specialist_bitmaps:
+                    bitmap |= self.specialist_bitmaps[specialist]
+        else:
+            bitmap = self.all_bitmap.copy()
+        for workplace in filters.get("exclude_workplace", []):
+            if workplace in self.workplace_positions:
+                self._clear(bitmap, self.workplace_positions[workplace])
+        if "exclude_expert_id" in filters:
+            expert_ids = np.asarray(filters["exclude_expert_id"], dtype=np.int64)
+            self._clear(bitmap, self.store.positions_of_ids(expert_ids))
+        return bitmap
+
+    def selector(self, filters: Optional[dict] = None) -> Optional[faiss.IDSelector]:
+        """
+        Compile filters into a FAISS ID selector, see `compile`.
+
+        Args:
+            `filters` (`Optional[dict]`): The filters, see the class docstring. Defaults to `None`.
+
+        Returns:
+            `Optional[faiss.IDSelector]`: The bitmap selector, the batch selector of the allowed expert IDs for an ID-mapped index, or `None` if no filter is set.
+        """
+        bitmap = self.compile(filters)
+        if bitmap is None:
+            return None
+        if self.id_mapped:
+            mask = np.unpackbits(bitmap, count=self.num_positions, bitorder="little")
+            expert_ids = np.ascontiguousarray(
+                self.store.expert_ids[mask.astype(bool)], dtype=np.int64
+            )
+            # The selector copies the IDs into its own hash set
+            return faiss.IDSelectorBatch(expert_ids.size, faiss.swig_ptr(expert_ids))
+        sel = faiss.IDSelectorBitmap(bitmap.size, faiss.swig_ptr(bitmap))
+        sel.referenced_objects = [bitmap]  # The selector does not own the bitmap
+        return sel
@@ -2,16 +2,77 @@ import os
 import random
 import numpy as np
 import torch
+from loguru import logger
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ExpertRecSystem.llms.mock_server import MockLLMServer
+
+# The mock server of the process, started once and reused by later initializations
+_mock_server: Optional["MockLLMServer"] = None
 
 
 def init_openai_api(api_config: dict):
     """Initialize OpenAI API.
 
     Args:
-        `api_config` (`dict`): OpenAI API configuration, should contain `api_base` and `api_key`.
+        `api_config` (`dict`): OpenAI API configuration, should contain `api_base` and `api_key`. An optional `llm_cache` section (`path`, `max_size_mb`, `mode`) enables the persistent response cache of deterministic LLM calls. An optional `http_client` section (see `HTTPClientRegistry`) makes all LLMs share one pooled HTTP client, and an optional `rate_limit` section (see `RateLimiter`) keeps them within the provider limits. The HTTP clients and the rate limiter are created once per process, so repeated initializations such as Streamlit reruns share one connection pool and one limit across all sessions. An enabled `mock_server` section (see `MockLLMServer`) starts a local stand-in server once per process and points all LLMs at it instead of `api_base`, with the response cache disabled so canned responses never mix with real ones. An enabled `cassette` section (`path`, `mode`, `latency`, see `Cassette`) records the LLM traffic or replays it offline.
     """
+    from ExpertRecSystem.llms.cache import LLMCache, set_llm_cache
+    from ExpertRecSystem.llms.client import (
+        HTTPClientRegistry,
+        set_http_clients,
+        get_http_clients,
+    )
+    from ExpertRecSystem.llms.ratelimit import (
+        RateLimiter,
+        set_rate_limiter,
+        get_rate_limiter,
+    )
+    from ExpertRecSystem.llms.mock_server import MockLLMServer
+    from ExpertRecSystem.llms.cassette import Cassette, set_cassette
+
     os.environ["OPENAI_API_BASE"] = api_config["api_base"]
     os.environ["OPENAI_API_KEY"] = api_config["api_key"]
+    global _mock_server
+    mock_config = api_config.get("mock_server")
+    mock = mock_config is not None and mock_config.get("enabled", False)
+    if mock:
+        if _mock_server is None:
+            mock_config = {k: v for k, v in mock_config.items() if k != "enabled"}
+            _mock_server = MockLLMServer(**mock_config)
+            _mock_server.start()
+        os.environ["OPENAI_API_BASE"] = _mock_server.url
+    cache_config = api_config.get("llm_cache")
+    if mock:
+        # The cache key has no API base, mock responses must not reach real runs
+        if cache_config is not None and cache_config.get("enabled", True):
+            logger.info("LLM response cache disabled while the mock server is on")
+        set_llm_cache(None)
+    elif cache_config is not None and cache_config.get("enabled", True):
+        cache_config = {k: v for k, v in cache_config.items() if k != "enabled"}
+        set_llm_cache(LLMCache(**cache_config))
+    client_config = api_config.get("http_client")
+    # LLMs keep the client they were created with, a new registry would split the pool
+    if (
+        client_config is not None
+        and client_config.get("enabled", True)
+        and get_http_clients() is None
+    ):
+        client_config = {k: v for k, v in client_config.items() if k != "enabled"}
+        set_http_clients(HTTPClientRegistry(**client_config))
+    limit_config = api_config.get("rate_limit")
+    if (
+        limit_config is not None
+        and limit_config.get("enabled", True)
+        and get_rate_limiter() is None
+    ):
+        limit_config = {k: v for k, v in limit_config.items() if k != "enabled"}
+        set_rate_limiter(RateLimiter(**limit_config))
+    cassette_config = api_config.get("cassette")
+    if cassette_config is not None and cassette_config.get("enabled", False):
+        cassette_config = {k: v for k, v in cassette_config.items() if k != "enabled"}
+        set_cassette(Cassette(**cassette_config))
 
 
 def init_all_seeds(seed: int = 0) -> None:
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import threading
+import datetime
+import pandas as pd
+from tqdm import tqdm
+from loguru import logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Optional
+
+
+class BatchRunner:
+    """
+    Runs a function over many items with a bounded pool of worker threads. Every result is appended to a JSON lines file as soon as it completes, so a crash only loses the items in flight, and a rerun resumes by skipping the items already in the file. Items that fail are written with their error to a retry file instead of being dropped, and are run again by the next run.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        retry_path: Optional[str] = None,
+        workers: int = 8,
+        log_interval: float = 60,
+        desc: str = "Running",
+    ) -> None:
+        """
+        Initialize the runner.
+
+        Args:
+            `output_path` (`str`): The JSON lines file of the results.
+            `retry_path` (`Optional[str]`): The JSON lines file of the failed items. Defaults to `None`, i.e. `output_path` with the suffix `.retry.jsonl`.
+            `workers` (`int`, optional): The number of items run concurrently. Defaults to `8`.
+            `log_interval` (`float`, optional): Seconds between progress logs with the throughput and the ETA, for runs watched through their log file. Defaults to `60`.
+            `desc` (`str`, optional): The description of the progress bar. Defaults to `Running`.
+        """
+        self.output_path = output_path
+        self.retry_path = (
+            retry_path or os.path.splitext(output_path)[0] + ".retry.jsonl"
+        )
+        self.workers = workers
+        self.log_interval = log_interval
+        self.desc = desc
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_jsonl(path: str) -> list[dict]:
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # The last line of a crashed run may be cut off
+                    logger.warning(f"Skipping a truncated line of {path}")
+        return records
+
+    def done_keys(self) -> set[str]:
+        """
+        Get the keys of the items already in the output file.
+
+        Returns:
+            `set[str]`: The keys.
+        """
+        return {record["key"] for record in self._read_jsonl(self.output_path)}
+
+    def read_failures(self) -> list[dict]:
+        """
+        Get the failures of the last run.
+
+        Returns:
+            `list[dict]`: The `key`, the `item` and the `error` of every failed item.
+        """
+        return self._read_jsonl(self.retry_path)
+
+    @staticmethod
+    def _terminate(path: str) -> None:
+        # End a line cut off by a crash, so the next record starts on its own line
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def _append(self, path: str, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def run(
+        self,
+        items: Iterable[dict],
+        func: Callable[[dict], dict] | Callable[[list[dict]], list[dict]],
+        key: str | Callable[[dict], Any],
+        pack: Optional[Callable[[list[dict]], list[list[dict]]]] = None,
+    ) -> dict[str, int | float]:
+        """
+        Run `func` over the items not yet in the output file.
+
+        Args:
+            `items` (`Iterable[dict]`): The items.
+            `func` (`Callable[[dict], dict] | Callable[[list[dict]], list[dict]]`): Maps an item to its result record, or with `pack` a pack of items to their result records in order. Must be thread-safe.
+            `key` (`str | Callable[[dict], Any]`): The item field, or a function of the item, that identifies it across runs.
+            `pack` (`Optional[Callable[[list[dict]], list[list[dict]]]]`): Groups the pending items into packs that `func` processes at once. A failed pack fails all its items. Defaults to `None`, i.e. one item at a time.
+
+        Returns:
+            `dict[str, int | float]`: The number of completed, skipped and failed items, and the throughput in items per second.
+        """
+        get_key = key if callable(key) else lambda item: item[key]
+        done = self.done_keys()
+        pending, skipped = [], 0
+        for item in items:
+            item_key = str(get_key(item))
+            if item_key in done:
+                skipped += 1
+                continue
+            done.add(item_key)  # Also drops duplicate items
+            pending.append(item)
+        if pack is None:
+            groups = [[item] for item in pending]
+        else:
+            groups = [group for group in pack(pending) if group]
+
+        def run_group(group: list[dict]) -> list[dict]:
+            if pack is None:
+                return [func(group[0])]
+            return func(group)
+
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        self._terminate(self.output_path)
+        # The retry file lists the failures of the latest run only
+        open(self.retry_path, "w").close()
+        completed, failed = 0, 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="runner"
+        ) as executor:
+            futures = {executor.submit(run_group, group): group for group in groups}
+            progress = tqdm(total=len(pending), desc=self.desc)
+            last_log = start
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    failed += len(group)
+                    for item in group:
+                        item_key = str(get_key(item))
+                        logger.error(f"Item {item_key} failed: {e!r}")
+                        self._append(
+                            self.retry_path,
+                            {"key": item_key, "item": item, "error": repr(e)},
+                        )
+                else:
+                    completed += len(group)
+                    for item, result in zip(group, results):
+                        self._append(
+                            self.output_path, {"key": str(get_key(item)), **result}
+                        )
+                progress.update(len(group))
+                now = time.perf_counter()
+                per_second = (completed + failed) / (now - start)
+                progress.set_postfix(failed=failed, per_second=f"{per_second:.2f}")
+                if now - last_log >= self.log_interval:
+                    last_log = now
+                    remaining = len(pending) - completed - failed
+                    eta = datetime.timedelta(seconds=round(remaining / per_second))
+                    logger.info(
+                        f"{completed + failed}/{len(pending)} items ({failed} failed), "
+                        f"{per_second:.2f} items/s, ETA {eta}"
+                    )
+            progress.close()
+        elapsed = time.perf_counter() - start
+        stats = {
+            "completed": completed,
+            "skipped": skipped,
+            "failed": failed,
+            "per_second": completed / elapsed if elapsed else 0.0,
+        }
+        logger.info(f"Batch run finished: {stats}")
+        if failed:
+            logger.warning(f"{failed} items failed, see {self.retry_path}")
+        return stats
+
+    def to_csv(
+        self, csv_path: str, keys: Optional[list[Any]] = None, **kwargs: Any
+    ) -> pd.DataFrame:
+        """
+        Export the results to a CSV file.
+
+        Args:
+            `csv_path` (`str`): The CSV file.
+            `keys` (`Optional[list[Any]]`): The keys in output order, e.g. the input order. Defaults to `None`, i.e. completion order.
+            `**kwargs` (`Any`): Additional keyword arguments for `DataFrame.to_csv`.
+
+        Returns:
+            `pd.DataFrame`: The results, without the `key` column.
+        """
+        results = pd.DataFrame(self._read_jsonl(self.output_path))
+        if results.empty:
+            results.to_csv(csv_path, index=False, **kwargs)
+            return results
+        results = results.drop_duplicates("key", keep="last").set_index("key")
+        if keys is not None:
+            results = results.reindex([str(k) for k in keys]).dropna(how="all")
+        results = results.reset_index(drop=True)
+        results.to_csv(csv_path, index=False, **kwargs)
+        return results
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+
+class StringColumn:
+    """
+    A column of strings packed into one contiguous byte buffer with an offset array. It avoids one Python object per cell and picks UTF-8 or UTF-16 per column, whichever is smaller (UTF-16 for mostly Chinese text).
+    """
+
+    def __init__(self, values: list[str]) -> None:
+        """
+        Pack the strings.
+
+        Args:
+            `values` (`list[str]`): The strings of the column.
+        """
+        values = ["" if pd.isna(value) else str(value) for value in values]
+        utf8 = [value.encode("utf-8") for value in values]
+        utf16 = [value.encode("utf-16-le") for value in values]
+        if sum(map(len, utf16)) < sum(map(len, utf8)):
+            self.encoding, encoded = "utf-16-le", utf16
+        else:
+            self.encoding, encoded = "utf-8", utf8
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        begin, end = self.offsets[position], self.offsets[position + 1]
+        return self.buffer[begin:end].tobytes().decode(self.encoding)
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.nbytes + self.offsets.nbytes
+
+
+class ExpertStore:
+    """
+    A compact, array-backed store of the expert metadata used during recall. It is loaded once, resolves experts in O(1) by index position, `expert_id` or name, and returns plain dict records without DataFrame copies.
+    """
+
+    def __init__(self, data: pd.DataFrame) -> None:
+        """
+        Build the store from the expert description data.
+
+        Args:
+            `data` (`pd.DataFrame`): The expert data with `expert_id`, `expert_name`, `specialist` and `description` columns, and optionally `workplace`.
+        """
+        self.expert_ids = data["expert_id"].to_numpy(dtype=np.int64)
+        self.names = StringColumn(data["expert_name"].tolist())
+        specialists = pd.Categorical(data["specialist"].fillna(""))
+        self.specialist_codes = specialists.codes.astype(np.int32)
+        self.specialist_values = list(specialists.categories)
+        workplaces = pd.Categorical(
+            data.get("workplace", pd.Series("", data.index)).fillna("")
+        )
+        self.workplace_codes = workplaces.codes.astype(np.int32)
+        self.workplace_values = list(workplaces.categories)
+        self.descriptions = StringColumn(data["description"].tolist())
+        self._id_positions = {
+            expert_id: position for position, expert_id in enumerate(self.expert_ids)
+        }
+        self._name_positions: dict[str, list[int]] = {}
+        for position in range(len(self)):
+            self._name_positions.setdefault(self.names[position], []).append(position)
+        self.pandas_nbytes = int(data.memory_usage(deep=True).sum())
+
+    def __len__(self) -> int:
+        return len(self.expert_ids)
+
+    def position_of(self, expert_id: int) -> Optional[int]:
+        """
+        Get the position of an expert.
+
+        Args:
+            `expert_id` (`int`): The expert ID.
+
+        Returns:
+            `Optional[int]`: The position, or `None` if the expert is not in the store.
+        """
+        return self._id_positions.get(int(expert_id))
+
+    def positions_of_name(self, name: str) -> list[int]:
+        """
+        Get the positions of all experts with the given name.
+
+        Args:
+            `name` (`str`): The expert name.
+
+        Returns:
+            `list[int]`: The positions, empty if no expert has the name.
+        """
+        return self._name_positions.get(name, [])
+
+    def positions_of_ids(self, expert_ids: np.ndarray) -> np.ndarray:
+        """
+        Get the positions of several experts. Experts that are not in the store get position -1.
+
+        Args:
+            `expert_ids` (`np.ndarray`): The expert IDs.
+
+        Returns:
+            `np.ndarray`: The positions.
+        """
+        return np.array(
+            [self._id_positions.get(int(expert_id), -1) for expert_id in expert_ids],
+            dtype=np.int64,
+        )
+
+    def record(self, position: int) -> dict:
+        """
+        Get the metadata record of the expert at a position.
+
+        Args:
+            `position` (`int`): The position of the expert.
+
+        Returns:
+            `dict`: The `expert_id`, `expert_name`, `specialist` and `description` of the expert.
+        """
+        return {
+            "expert_id": int(self.expert_ids[position]),
+            "expert_name": self.names[position],
+            "specialist": self.specialist_values[self.specialist_codes[position]],
+            "description": self.descriptions[position],
+        }
+
+    def records(self, positions: np.ndarray) -> list[dict]:
+        """
+        Get the metadata records of the experts at several positions.
+
+        Args:
+            `positions` (`np.ndarray`): The positions of the experts.
+
+        Returns:
+            `list[dict]`: The records, in the order of `positions`.
+        """
+        return [self.record(position) for position in positions]
+
+    def by_id(self, expert_id: int) -> Optional[dict]:
+        """
+        Get the metadata record of an expert by ID.
+
+        Args:
+            `expert_id` (`int`): The expert ID.
+
+        Returns:
+            `Optional[dict]`: The record, or `None` if the expert is not in the store.
+        """
+        position = self.position_of(expert_id)
+        return None if position is None else self.record(position)
+
+    def by_name(self, name: str) -> list[dict]:
+        """
+        Get the metadata records of all experts with the given name.
+
+        Args:
+            `name` (`str`): The expert name.
+
+        Returns:
+            `list[dict]`: The records, empty if no expert has the name.
+        """
+        return self.records(self.positions_of_name(name))
+
+    def memory_usage(self) -> dict[str, int]:
+        """
+        Get the memory footprint of the store in bytes, per column and in total, next to the footprint of the DataFrame it was built from.
+
+        Returns:
+            `dict[str, int]`: The bytes used by each column, the `total`, and `pandas` for comparison.
+        """
+        usage = {
+            "expert_id": self.expert_ids.nbytes,
+            "expert_name": self.names.nbytes,
+            "specialist": self.specialist_codes.nbytes
+            + sum(len(value.encode("utf-8")) for value in self.specialist_values),
+            "workplace": self.workplace_codes.nbytes
+            + sum(len(value.encode("utf-8")) for value in self.workplace_values),
+            "description": self.descriptions.nbytes,
+        }
+        usage["total"] = sum(usage.values())
+        usage["pandas"] = self.pandas_nbytes
+        return usage
+
+
+def read_expert_store(
+    data_path: str, attribute_path: Optional[str] = None
+) -> ExpertStore:
+    """
+    Read the expert description CSV into an `ExpertStore`.
+
+    Args:
+        `data_path` (`str`): The path to the CSV file containing the expert descriptions.
+        `attribute_path` (`Optional[str]`): The path to the raw expert CSV to take the `workplace` of every expert from, joined on `expert_id`. Defaults to `None`.
+
+    Returns:
+        `ExpertStore`: The expert store.
+    """
+    data = pd.read_csv(data_path, encoding="utf-8")
+    if attribute_path is not None and "workplace" not in data.columns:
+        attributes = pd.read_csv(
+            attribute_path, encoding="utf-8", usecols=["expert_id", "workplace"]
+        ).drop_duplicates("expert_id")
+        data = data.merge(attributes, on="expert_id", how="left")
+    return ExpertStore(data)
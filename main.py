@@ -1,13 +1,14 @@
 import os
 import sys
 import torch
+import pandas as pd
 from loguru import logger
 from argparse import ArgumentParser
 from ExpertRecSystem.system import CollaborationSystem
 from ExpertRecSystem.utils import init_openai_api, read_json
 
 
-def main(user_input, top_k, num):
+def main(user_input, top_k, num, input_path=None, output_path=None, filters=None):
     logger.remove()
     logger.add(sys.stderr, level="DEBUG")
     os.makedirs("logs", exist_ok=True)
@@ -21,20 +22,63 @@ def main(user_input, top_k, num):
     system = CollaborationSystem(config_path=system_config, device=device)
     logger.debug("Initializing CollaborationSystem")
 
+    if input_path is not None:
+        recall_projects(system, input_path, output_path, top_k, filters)
+        return
+
     logger.debug(f"Received user input: {user_input}")
     logger.debug(f"Top K: {top_k}, Num: {num}")
 
     logger.debug("Running the CollaborationSystem")
-    results = system(user_input, top_k=top_k, num=num)
+    results = system(user_input, top_k=top_k, num=num, filters=filters)
 
     logger.debug("System execution completed")
     logger.debug(f"Results: {results}")
 
 
+def recall_projects(system, input_path, output_path, top_k, filters=None):
+    projects = pd.read_csv(input_path, encoding="utf-8")
+    logger.debug(f"Recalling experts for {len(projects)} projects from {input_path}")
+    user_inputs = projects[["project_name", "project_infos"]].values.tolist()
+    expert_info_lists = system.recall_batch(user_inputs, top_k=top_k, filters=filters)
+    projects["expert_ids"] = [
+        [expert["expert_id"] for expert in experts] for experts in expert_info_lists
+    ]
+    projects["expert_names"] = [
+        [expert["expert_name"] for expert in experts] for experts in expert_info_lists
+    ]
+    projects["similarities"] = [
+        [round(expert["similarity"], 4) for expert in experts]
+        for experts in expert_info_lists
+    ]
+    projects.to_csv(output_path, index=False, encoding="utf-8-sig")
+    logger.debug(f"Recall results saved to {output_path}")
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
+    parser.add_argument("--user_input", nargs="+", help="User input for the system")
+    parser.add_argument(
+        "--input_path",
+        type=str,
+        help="CSV file of projects (project_name, project_infos) to recall experts for in one batch",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default="data/processed/recall_results.csv",
+        help="Where to write the batch recall results",
+    )
     parser.add_argument(
-        "--user_input", nargs="+", required=True, help="User input for the system"
+        "--specialist", nargs="+", help="Only recall experts of these specialties"
+    )
+    parser.add_argument(
+        "--exclude_workplace",
+        nargs="+",
+        help="Do not recall experts from these workplaces, e.g. the purchasing university",
+    )
+    parser.add_argument(
+        "--exclude_expert_id", nargs="+", type=int, help="Do not recall these experts"
     )
     parser.add_argument(
         "--top_k", type=int, required=True, help="Number of experts to recall"
@@ -44,5 +88,20 @@ if __name__ == "__main__":
     )
 
     args = parser.parse_args()
+    if args.user_input is None and args.input_path is None:
+        parser.error("one of --user_input or --input_path is required")
+
+    filters = {
+        "specialist": args.specialist,
+        "exclude_workplace": args.exclude_workplace,
+        "exclude_expert_id": args.exclude_expert_id,
+    }
 
-    main(args.user_input, args.top_k, args.num)
+    main(
+        args.user_input,
+        args.top_k,
+        args.num,
+        args.input_path,
+        args.output_path,
+        filters,
+    )
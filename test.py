@@ -1,8 +1,23 @@
 from ExpertRecSystem.system import CollaborationSystem
 from ExpertRecSystem.utils import init_openai_api, read_json
 import torch
+import asyncio
+import argparse
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--recall_batch",
+        action="store_true",
+        help="Also recall experts for several projects with one batched search",
+    )
+    parser.add_argument(
+        "--aforward",
+        action="store_true",
+        help="Also recommend experts for several projects concurrently with aforward",
+    )
+    args = parser.parse_args()
+
     init_openai_api(read_json("config/openai-api.json"))
     system_config = "config/systems/chat.json"
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -13,3 +28,26 @@ if __name__ == "__main__":
         "大连理工大学拟采购智能离子膜规模化制造装置一套。该装置可对智能离子膜制备全过程进行调控及综合评价，实现智能离子膜规模化制造。",
     ]
     system(user_input, top_k=5, num=3)
+
+    projects = [
+        user_input,
+        [
+            "某高校高性能计算集群扩容采购项目",
+            "拟采购计算节点、高速互联网络及并行存储系统，用于扩容校级高性能计算平台。",
+        ],
+    ]
+    if args.recall_batch:
+        for project, experts in zip(projects, system.recall_batch(projects, top_k=5)):
+            print(project[0], [expert["expert_name"] for expert in experts])
+
+    async def recommend_all():
+        return await asyncio.gather(
+            *[
+                system.aforward(project, reset=False, top_k=5, num=3, explain=False)
+                for project in projects
+            ]
+        )
+
+    if args.aforward:
+        for project, results in zip(projects, asyncio.run(recommend_all())):
+            print(project[0], results)